@@ -8,3 +8,11 @@ register(
     id='go-extrahard-v0',
     entry_point='gym_go.envs:GoExtraHardEnv',
 )
+register(
+    id='vec-go-v0',
+    entry_point='gym_go.envs:VecGoEnv',
+)
+register(
+    id='subproc-vec-go-v0',
+    entry_point='gym_go.envs:SubprocVecGoEnv',
+)
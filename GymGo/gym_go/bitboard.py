@@ -0,0 +1,222 @@
+from functools import lru_cache
+
+import numpy as np
+
+from GymGo.gym_go import govars, state_utils
+
+"""
+Bitboard rules backend
+
+Same API and same numpy state as gogame (init_state, next_state, valid_moves, areas, game_ended),
+but the black and white pieces are packed into Python ints for the rule computations.
+Flood fill, liberties and captures are then shifts and masks over whole bitsets.
+
+Layout: point (row, col) is bit row * (size + 1) + col. The extra column of every row stays empty,
+so horizontal shifts never wrap around to the next row once masked by the board.
+
+Select it for gogame with the environment variable GYM_GO_BACKEND=bitboard
+"""
+
+
+class _Geometry:
+    def __init__(self, size):
+        self.size = size
+        self.width = size + 1
+        self.num_bits = size * self.width
+        self.num_bytes = (self.num_bits + 7) // 8
+        self.mask = self.to_bits(np.ones((size, size)))
+
+    def to_bits(self, plane):
+        padded = np.zeros((self.size, self.width), dtype=np.uint8)
+        padded[:, :self.size] = plane
+        return int.from_bytes(np.packbits(padded.ravel(), bitorder='little').tobytes(), 'little')
+
+    def from_bits(self, bits):
+        packed = np.frombuffer(bits.to_bytes(self.num_bytes, 'little'), dtype=np.uint8)
+        unpacked = np.unpackbits(packed, count=self.num_bits, bitorder='little')
+        return unpacked.reshape(self.size, self.width)[:, :self.size]
+
+    def bit(self, row, col):
+        return 1 << int(row * self.width + col)
+
+    def dilate(self, bits):
+        """
+        :return: The neighbors of the points in bits, on the board
+        """
+        width = self.width
+        return ((bits << 1) | (bits >> 1) | (bits << width) | (bits >> width)) & self.mask
+
+    def flood(self, seed, region):
+        """
+        :return: The connected component of region that contains seed
+        """
+        group = seed
+        while True:
+            grown = (group | self.dilate(group)) & region
+            if grown == group:
+                return group
+            group = grown
+
+    def groups(self, pieces):
+        """
+        Yields every connected group of pieces
+        """
+        while pieces:
+            group = self.flood(pieces & -pieces, pieces)
+            pieces &= ~group
+            yield group
+
+
+@lru_cache(maxsize=None)
+def geometry(size):
+    return _Geometry(size)
+
+
+def popcount(bits):
+    return bin(bits).count('1')
+
+
+def init_state(size, dtype=np.float64):
+    return np.zeros((govars.NUM_CHNLS, size, size), dtype=dtype)
+
+
+def next_state(state, action1d, canonical=False):
+    # Deep copy the state to modify
+    state = np.copy(state)
+
+    # Initialize basic variables
+    geo = geometry(state.shape[1])
+    pass_idx = geo.size ** 2
+    passed = action1d == pass_idx
+    action2d = action1d // geo.size, action1d % geo.size
+
+    player = int(np.max(state[govars.TURN_CHNL]))
+    opponent = 1 - player
+    previously_passed = np.max(state[govars.PASS_CHNL] == 1) == 1
+    ko_protect = None
+
+    pieces = [geo.to_bits(state[govars.BLACK]), geo.to_bits(state[govars.WHITE])]
+
+    if passed:
+        # We passed
+        state[govars.PASS_CHNL] = 1
+        if previously_passed:
+            # Game ended
+            state[govars.DONE_CHNL] = 1
+    else:
+        # Move was not pass
+        state[govars.PASS_CHNL] = 0
+
+        # Assert move is valid
+        assert state[govars.INVD_CHNL, action2d[0], action2d[1]] == 0, ("Invalid move", action2d)
+
+        # Add piece
+        state[player, action2d[0], action2d[1]] = 1
+        move = geo.bit(*action2d)
+        pieces[player] |= move
+
+        # Whether every on-board neighbor is an opponent's piece
+        adj = geo.dilate(move)
+        surrounded = not adj & ~pieces[opponent]
+
+        # Kill adjacent opponent groups without liberties
+        empties = geo.mask & ~(pieces[govars.BLACK] | pieces[govars.WHITE])
+        adj_opp = adj & pieces[opponent]
+        killed_groups = []
+        while adj_opp:
+            opp_group = geo.flood(adj_opp & -adj_opp, pieces[opponent])
+            adj_opp &= ~opp_group
+            if not geo.dilate(opp_group) & empties:
+                killed_groups.append(opp_group)
+
+        if killed_groups:
+            for killed_group in killed_groups:
+                pieces[opponent] &= ~killed_group
+            state[opponent] = geo.from_bits(pieces[opponent])
+
+        # If only killed one group, and that one group was one piece, and piece set is surrounded,
+        # activate ko protection
+        if len(killed_groups) == 1 and surrounded and popcount(killed_groups[0]) == 1:
+            ko_protect = killed_groups[0]
+
+    # Update invalid moves
+    state[govars.INVD_CHNL] = geo.from_bits(invalid_bits(geo, pieces, opponent, ko_protect))
+
+    # Switch turn
+    state_utils.set_turn(state)
+
+    if canonical:
+        # Set canonical form
+        if opponent == govars.WHITE:
+            state[[govars.BLACK, govars.WHITE]] = state[[govars.WHITE, govars.BLACK]]
+            state_utils.set_turn(state)
+
+    return state
+
+
+def invalid_bits(geo, pieces, player, ko_protect=None):
+    """
+    Invalid moves of player, same rules as state_utils.compute_invalid_moves
+    :param geo:
+    :param pieces: [black bits, white bits]
+    :param player: Who's about to move
+    :param ko_protect: Bit of the ko-protected point
+    :return: Bits of the invalid moves
+    """
+    empties = geo.mask & ~(pieces[govars.BLACK] | pieces[govars.WHITE])
+
+    # Not surrounded
+    valids = empties & geo.dilate(empties)
+    # Single liberties of opponent groups (captures) and multi-liberties of own groups
+    for group in geo.groups(pieces[player]):
+        liberties = geo.dilate(group) & empties
+        if liberties & (liberties - 1):
+            valids |= liberties
+    for group in geo.groups(pieces[1 - player]):
+        liberties = geo.dilate(group) & empties
+        if liberties and not liberties & (liberties - 1):
+            valids |= liberties
+
+    invalids = geo.mask & ~valids
+    if ko_protect is not None:
+        invalids |= ko_protect
+    return invalids
+
+
+def invalid_moves(state):
+    # return a fixed size binary vector
+    if game_ended(state):
+        return np.zeros(state.shape[1] * state.shape[2] + 1)
+    return np.append(state[govars.INVD_CHNL].flatten(), 0)
+
+
+def valid_moves(state):
+    return 1 - invalid_moves(state)
+
+
+def game_ended(state):
+    """
+    :param state:
+    :return: 0/1 = game not ended / game ended respectively
+    """
+    return int(np.all(state[govars.DONE_CHNL] == 1))
+
+
+def areas(state):
+    '''
+    Return black area, white area
+    '''
+    geo = geometry(state.shape[1])
+    blacks, whites = geo.to_bits(state[govars.BLACK]), geo.to_bits(state[govars.WHITE])
+
+    black_area, white_area = popcount(blacks), popcount(whites)
+    for empty_area in geo.groups(geo.mask & ~(blacks | whites)):
+        neighbors = geo.dilate(empty_area)
+        black_claim = neighbors & blacks
+        white_claim = neighbors & whites
+        if black_claim and not white_claim:
+            black_area += popcount(empty_area)
+        elif white_claim and not black_claim:
+            white_area += popcount(empty_area)
+
+    return black_area, white_area
@@ -0,0 +1,370 @@
+import numpy as np
+
+from GymGo.gym_go import govars, state_utils, zobrist
+
+"""
+An incremental companion to the numpy state of gogame
+
+Stone groups are kept in a union-find structure: placing a stone merges it with the adjacent
+groups of its own colour (union by size, the smaller group is relabelled), capturing a group
+dissolves it. Every group keeps its liberty set and liberty count, so a move only touches the
+neighbourhood of the placed and captured stones. The Zobrist hash of the position is updated along.
+
+With superko, the board also keeps the set of the positions (stones only) seen in the game, and
+marks the moves that would repeat one of them as invalid. Every group keeps the XOR of its piece
+keys, so the position after a move is found in O(1) per candidate move.
+
+The true eyes of both colours (see state_utils.BoardAnalysis.eyes) are kept as well, re-evaluated
+only in the 3x3 neighbourhoods of the placed and captured stones.
+
+A move can be recorded in an undo log, to take it back with undo(): the log keeps the previous
+liberty sets, stones and hashes of the groups the move touched, so search can walk a single board
+down the tree and back up.
+
+All indices are 1D (row * size + col). Index size ** 2 is an off-board sentinel.
+"""
+
+EMPTY = 2
+EDGE = 3
+
+
+class Board:
+    def __init__(self, size, superko=False):
+        self.size = size
+        self.pass_idx = size ** 2
+        self.geometry = state_utils.geometry(size)
+        self.neighbors = self.geometry.neighbors
+
+        # Colour of every point, the sentinel is an edge
+        self.color = np.full(self.pass_idx + 1, EMPTY, dtype=np.int8)
+        self.color[self.pass_idx] = EDGE
+        # Root of the group of every stone. Empty points and the sentinel point to the sentinel
+        self.group = np.full(self.pass_idx + 1, self.pass_idx, dtype=np.int64)
+        # Liberty count of every group, indexed by its root. The sentinel has no liberties
+        self.lib_counts = np.zeros(self.pass_idx + 1, dtype=np.int64)
+        # Liberty set and stones of every group, keyed by its root
+        self.libs = {}
+        self.members = {}
+
+        self.turn = govars.BLACK
+        self.ko = None
+        self.keys = zobrist.get_keys(size)
+        self.hash = np.uint64(0)
+        # XOR of the piece keys of every group, indexed by its root
+        self.group_hashes = np.zeros(self.pass_idx + 1, dtype=np.uint64)
+        # Hashes of the positions seen in the game, None without superko.
+        # Shared with the copies of the board until one of them adds or removes a hash
+        self.history = {0} if superko else None
+        self._history_shared = False
+        # Undo records of the recorded moves, last move last
+        self.undo_log = []
+        # True eyes of each colour, indexed by colour and 1D index. The sentinel is never an eye
+        self.eyes = np.zeros((2, self.pass_idx + 1), dtype=bool)
+        self._update_eyes(np.arange(self.pass_idx))
+
+    @classmethod
+    def from_state(cls, state, ko=None, superko=False):
+        """
+        Builds the board of a numpy state
+        :param state:
+        :param ko: 1D index of the ko-protected point, if known. It is only needed to recompute the
+        invalid moves of this very position, which the INVD_CHNL of the state already holds
+        :param superko: The positions before this one are unknown, only this one is then recorded
+        :return:
+        """
+        board = cls(state.shape[1], superko)
+        board.turn = int(np.max(state[govars.TURN_CHNL]))
+        board.ko = ko
+
+        stones = []
+        for player in [govars.BLACK, govars.WHITE]:
+            for idx in np.flatnonzero(state[player]).tolist():
+                board.color[idx] = player
+                board.group[idx] = idx
+                board.members[idx] = [idx]
+                board.libs[idx] = set()
+                board.group_hashes[idx] = board.keys.pieces[player, idx]
+                stones.append(idx)
+
+        for idx in stones:
+            for neighbor in board.neighbors[idx].tolist():
+                root, neighbor_root = int(board.group[idx]), int(board.group[neighbor])
+                if board.color[neighbor] == board.color[idx] and neighbor_root != root:
+                    board._union(root, neighbor_root)
+                elif board.color[neighbor] == EMPTY:
+                    board.libs[root].add(neighbor)
+
+        for root, libs in board.libs.items():
+            board.lib_counts[root] = len(libs)
+        board._update_eyes(np.arange(board.pass_idx))
+        board.hash = zobrist.hash_state(state, ko)
+        if superko:
+            board.history = {int(board.position_hash())}
+        return board
+
+    def copy(self):
+        board = Board.__new__(Board)
+        board.size = self.size
+        board.pass_idx = self.pass_idx
+        board.geometry = self.geometry
+        board.neighbors = self.neighbors
+        board.color = np.copy(self.color)
+        board.group = np.copy(self.group)
+        board.lib_counts = np.copy(self.lib_counts)
+        board.libs = {root: set(libs) for root, libs in self.libs.items()}
+        board.members = {root: list(members) for root, members in self.members.items()}
+        board.turn = self.turn
+        board.ko = self.ko
+        board.keys = self.keys
+        board.hash = self.hash
+        board.group_hashes = np.copy(self.group_hashes)
+        # Copy-on-write, the history grows with the game
+        board.history = self.history
+        board._history_shared = self._history_shared = self.history is not None
+        board.undo_log = []
+        board.eyes = np.copy(self.eyes)
+        return board
+
+    def position_hash(self):
+        """
+        :return: The Zobrist hash of the stones only, without the turn and the ko-protection
+        """
+        position_hash = self.hash ^ self.keys.ko[-1 if self.ko is None else self.ko]
+        if self.turn == govars.WHITE:
+            position_hash ^= self.keys.turn
+        return position_hash
+
+    def play(self, action1d, record=False):
+        """
+        Plays a move for the player whose turn it is. Assumes the move is valid
+        :param action1d:
+        :param record: Keep an undo record of the move, to take it back with undo()
+        :return: The killed groups, each one an array of 1D indices
+        """
+        player = self.turn
+        opponent = 1 - player
+        killed_groups = []
+        undo = None
+        if record:
+            undo = _Undo(action1d, self.hash, self.turn, self.ko)
+            self.undo_log.append(undo)
+
+        self.hash ^= self.keys.turn ^ self.keys.ko[-1 if self.ko is None else self.ko]
+        self.turn = opponent
+        self.ko = None
+        if action1d == self.pass_idx:
+            self._add_history(undo)
+            return killed_groups
+
+        neighbors = self.neighbors[action1d]
+        neighbor_colors = self.color[neighbors]
+        # Whether every on-board neighbor is an opponent's piece
+        surrounded = ((neighbor_colors == opponent) | (neighbor_colors == EDGE)).all()
+
+        # Add piece
+        self.hash ^= self.keys.pieces[player, action1d]
+        self.color[action1d] = player
+        self.group[action1d] = action1d
+        self.members[action1d] = [action1d]
+        self.libs[action1d] = set(neighbors[neighbor_colors == EMPTY].tolist())
+        self.group_hashes[action1d] = self.keys.pieces[player, action1d]
+
+        # Merge with our adjacent groups, and take the liberty away from all adjacent groups
+        adj_roots = set(self.group[neighbors[neighbor_colors < EMPTY]].tolist())
+        if undo is not None:
+            for adj_root in adj_roots:
+                undo.save(self, adj_root)
+        root = action1d
+        for adj_root in adj_roots:
+            self.libs[adj_root].discard(action1d)
+            if self.color[adj_root] == player:
+                root = self._union(root, adj_root)
+
+        # Kill adjacent opponent groups without liberties
+        touched = {root}
+        for adj_root in adj_roots:
+            if self.color[adj_root] == opponent:
+                if self.libs[adj_root]:
+                    touched.add(adj_root)
+                else:
+                    killed_groups.append(self._remove(adj_root, touched, undo))
+
+        for touched_root in touched:
+            self.lib_counts[touched_root] = len(self.libs[touched_root])
+
+        # If only killed one group, and that one group was one piece, and piece set is surrounded,
+        # activate ko protection
+        if len(killed_groups) == 1 and surrounded and len(killed_groups[0]) == 1:
+            self.ko = int(killed_groups[0][0])
+            self.hash ^= self.keys.ko[self.ko]
+
+        self._update_eyes(np.concatenate([[action1d], *killed_groups]).astype(np.int64))
+
+        self._add_history(undo)
+        return killed_groups
+
+    def undo(self):
+        """
+        Takes back the last move played with record=True
+        :return:
+        """
+        undo = self.undo_log.pop()
+        self.hash, self.turn, self.ko = undo.hash, undo.turn, undo.ko
+        if undo.history_hash is not None:
+            self._own_history()
+            self.history.discard(undo.history_hash)
+        if undo.action1d == self.pass_idx:
+            return
+
+        # Remove the piece. It may have become the root of the merged group
+        self.color[undo.action1d] = EMPTY
+        self.group[undo.action1d] = self.pass_idx
+        self.group_hashes[undo.action1d] = 0
+        self.lib_counts[undo.action1d] = 0
+        self.libs.pop(undo.action1d, None)
+        self.members.pop(undo.action1d, None)
+
+        # Restore the groups the move merged, captured or gave liberties to
+        changed = [undo.action1d]
+        for root, (color, members, libs, group_hash) in undo.groups.items():
+            self.color[members] = color
+            self.group[members] = root
+            self.members[root] = members
+            self.libs[root] = libs
+            self.lib_counts[root] = len(libs)
+            self.group_hashes[root] = group_hash
+            if color != undo.turn:
+                changed.extend(members)
+        self._update_eyes(np.array(changed))
+
+    def _update_eyes(self, changed):
+        """
+        Re-evaluates the true eyes in the 3x3 neighbourhoods of the changed points
+        :param changed: 1D indices of the points whose colour changed
+        """
+        points = np.concatenate([changed, self.neighbors[changed].flatten(),
+                                 self.geometry.diagonals[changed].flatten()])
+        points = np.unique(points[points != self.pass_idx])
+
+        neighbor_colors = self.color[self.neighbors[points]]
+        diagonal_colors = self.color[self.geometry.diagonals[points]]
+        empty = self.color[points] == EMPTY
+        on_side = self.geometry.on_side.flat[points]
+        for player in [govars.BLACK, govars.WHITE]:
+            # Off-board points count as pieces of player
+            sides = ((neighbor_colors == player) | (neighbor_colors == EDGE)).all(axis=1)
+            num_corners = ((diagonal_colors == player) | (diagonal_colors == EDGE)).sum(axis=1)
+            self.eyes[player, points] = empty & sides & np.where(on_side, num_corners == 4, num_corners > 2)
+
+    def _add_history(self, undo):
+        if self.history is None:
+            return
+        position_hash = int(self.position_hash())
+        if undo is not None and position_hash not in self.history:
+            undo.history_hash = position_hash
+        if position_hash not in self.history:
+            self._own_history()
+            self.history.add(position_hash)
+
+    def _own_history(self):
+        """
+        Copies the history before changing it, if it is still shared with a copy of the board
+        """
+        if self._history_shared:
+            self.history = set(self.history)
+            self._history_shared = False
+
+    def invalid_moves(self):
+        """
+        Invalid moves of the player whose turn it is, including ko-protection.
+        Same rules as state_utils.compute_invalid_moves, read off the neighbor colors and the liberty counts
+        :return: A (size, size) bool array
+        """
+        neighbor_colors = self.color[self.neighbors]
+        neighbor_libs = self.lib_counts[self.group[self.neighbors]]
+
+        valid = (neighbor_colors == EMPTY).any(axis=1)
+        valid |= ((neighbor_colors == self.turn) & (neighbor_libs > 1)).any(axis=1)
+        valid |= ((neighbor_colors == 1 - self.turn) & (neighbor_libs == 1)).any(axis=1)
+        valid &= self.color[:-1] == EMPTY
+
+        if self.ko is not None:
+            valid[self.ko] = False
+        if self.history is not None:
+            candidates = np.flatnonzero(valid)
+            repeats = [position_hash in self.history
+                       for position_hash in self.next_position_hashes(candidates).tolist()]
+            valid[candidates[repeats]] = False
+        return ~valid.reshape(self.size, self.size)
+
+    def next_position_hashes(self, actions):
+        """
+        Position hashes after each of the given moves by the player whose turn it is. Assumes the moves are valid
+        :param actions: 1D indices of non-pass moves
+        :return: A uint64 array like actions
+        """
+        neighbor_roots = self.group[self.neighbors[actions]]
+        # Adjacent opponent groups in atari are captured, each one counted once
+        captured = (self.color[neighbor_roots] == 1 - self.turn) & (self.lib_counts[neighbor_roots] == 1)
+        for i in range(1, neighbor_roots.shape[1]):
+            captured[:, i] &= (neighbor_roots[:, :i] != neighbor_roots[:, i:i + 1]).all(axis=1)
+        captured_hashes = np.where(captured, self.group_hashes[neighbor_roots], np.uint64(0))
+
+        next_hashes = self.position_hash() ^ self.keys.pieces[self.turn, actions]
+        return next_hashes ^ np.bitwise_xor.reduce(captured_hashes, axis=1)
+
+    def _union(self, root_a, root_b):
+        if len(self.members[root_a]) < len(self.members[root_b]):
+            root_a, root_b = root_b, root_a
+        absorbed = self.members.pop(root_b)
+        self.group[absorbed] = root_a
+        self.members[root_a].extend(absorbed)
+        self.libs[root_a] |= self.libs.pop(root_b)
+        self.group_hashes[root_a] ^= self.group_hashes[root_b]
+        self.group_hashes[root_b] = 0
+        return root_a
+
+    def _remove(self, root, touched, undo=None):
+        captor = 1 - self.color[root]
+        stones = np.array(self.members.pop(root))
+        del self.libs[root]
+        self.hash ^= self.group_hashes[root]
+        self.group_hashes[root] = 0
+        self.color[stones] = EMPTY
+        self.group[stones] = self.pass_idx
+        self.lib_counts[root] = 0
+
+        # The captured points become liberties of the adjacent captor groups
+        neighbors = self.neighbors[stones]
+        captor_neighbors = self.color[neighbors] == captor
+        for stone, neighbor in zip(np.repeat(stones, 4)[captor_neighbors.flatten()].tolist(),
+                                   neighbors[captor_neighbors].tolist()):
+            neighbor_root = int(self.group[neighbor])
+            if undo is not None:
+                undo.save(self, neighbor_root)
+            self.libs[neighbor_root].add(stone)
+            touched.add(neighbor_root)
+        return stones
+
+
+class _Undo:
+    """
+    Undo record of a move: the board scalars before it, and the state before it of every group it touched
+    """
+
+    def __init__(self, action1d, hash, turn, ko):
+        self.action1d = action1d
+        self.hash = hash
+        self.turn = turn
+        self.ko = ko
+        # Hash added to the superko history by the move, if any
+        self.history_hash = None
+        # Colour, stones, liberty set and piece hash of every touched group, keyed by its root
+        self.groups = {}
+
+    def save(self, board, root):
+        # Only the first state of a group counts, and the placed piece is removed separately
+        if root in self.groups or root == self.action1d:
+            return
+        self.groups[root] = (int(board.color[root]), list(board.members[root]), set(board.libs[root]),
+                             board.group_hashes[root])
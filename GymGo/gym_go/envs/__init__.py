@@ -1,2 +1,4 @@
 from gym_go.envs.go_env import GoEnv
 from gym_go.envs.go_extrahard_env import GoExtraHardEnv
+from gym_go.envs.vec_go_env import VecGoEnv
+from gym_go.envs.subproc_vec_go_env import SubprocVecGoEnv
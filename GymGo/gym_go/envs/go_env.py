@@ -4,6 +4,7 @@ import gym
 import numpy as np
 
 from GymGo.gym_go import govars, rendering, gogame
+from GymGo.gym_go.board import Board
 
 
 class RewardMethod(Enum):
@@ -16,21 +17,83 @@ class RewardMethod(Enum):
     HEURISTIC = 'heuristic'
 
 
+class LazyInfo(dict):
+    """
+    Info dict whose values are computed on first access. Its keys are there from the start, the values stay
+    None in the underlying dict until read through __getitem__, get, values, items or a copy of the dict
+    """
+
+    def __init__(self, **fns):
+        super().__init__(dict.fromkeys(fns))
+        self._fns = fns
+
+    def __getitem__(self, key):
+        if key in self._fns:
+            super().__setitem__(key, self._fns.pop(key)())
+        return super().__getitem__(key)
+
+    def __setitem__(self, key, value):
+        self._fns.pop(key, None)
+        super().__setitem__(key, value)
+
+    def __iter__(self):
+        # Overridden so that dict(info) and {**info} read the values through __getitem__
+        return super().__iter__()
+
+    def __eq__(self, other):
+        return dict(self) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def copy(self):
+        return dict(self)
+
+
+def readonly_view(array):
+    """
+    :return: read-only view of array, without copying it
+    """
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
 class GoEnv(gym.Env):
     metadata = {'render.modes': ['terminal', 'human']}
     govars = govars
     gogame = gogame
 
-    def __init__(self, size, komi=0, reward_method='real'):
+    def __init__(self, size, komi=0, reward_method='real', superko=False, dtype=np.float64, readonly_views=False):
         '''
         @param reward_method: either 'heuristic' or 'real'
         heuristic: gives # black pieces - # white pieces.
         real: gives 0 for in-game move, 1 for winning, -1 for losing,
             0 for draw, all from black player's perspective
+        @param superko: whether moves repeating a previous position of the game are invalid (positional superko)
+        @param dtype: dtype of the state, np.uint8 or np.bool_ for compact states
+        @param readonly_views: whether reset, step and state return read-only views of the state instead of copies,
+            and step computes its info lazily. Every step makes a new state, so the views stay valid
         '''
         self.size = size
         self.komi = komi
-        self.state_ = gogame.init_state(size)
+        self.superko = superko
+        self.dtype = dtype
+        self.readonly_views = readonly_views
+        self.state_ = gogame.init_state(size, dtype)
+        self.board = Board(size, superko) if superko else None
         self.reward_method = RewardMethod(reward_method)
         self.observation_space = gym.spaces.Box(np.float32(0), np.float32(govars.NUM_CHNLS),
                                                 shape=(govars.NUM_CHNLS, size, size))
@@ -42,9 +105,10 @@ class GoEnv(gym.Env):
         Reset state, go_board, curr_player, prev_player_passed,
         done, return state
         '''
-        self.state_ = gogame.init_state(self.size)
+        self.state_ = gogame.init_state(self.size, self.dtype)
+        self.board = Board(self.size, self.superko) if self.superko else None
         self.done = False
-        return np.copy(self.state_)
+        return self.state()
 
     def step(self, action):
         '''
@@ -59,8 +123,14 @@ class GoEnv(gym.Env):
         elif action is None:
             action = self.size ** 2
 
-        self.state_ = gogame.next_state(self.state_, action, canonical=False)
+        self.state_ = gogame.next_state(self.state_, action, canonical=False, board=self.board)
         self.done = gogame.game_ended(self.state_)
+        if self.readonly_views:
+            state = self.state_
+            info = LazyInfo(turn=lambda: gogame.turn(state),
+                            invalid_moves=lambda: gogame.invalid_moves(state),
+                            prev_player_passed=lambda: gogame.prev_player_passed(state))
+            return readonly_view(state), self.reward(), self.done, info
         return np.copy(self.state_), self.reward(), self.done, self.info()
 
     def game_ended(self):
@@ -92,8 +162,10 @@ class GoEnv(gym.Env):
 
     def state(self):
         """
-        :return: copy of state
+        :return: copy of state, or a read-only view of it with readonly_views
         """
+        if self.readonly_views:
+            return readonly_view(self.state_)
         return np.copy(self.state_)
 
     def canonical_state(self):
@@ -108,6 +180,12 @@ class GoEnv(gym.Env):
         """
         return gogame.children(self.state_, canonical, padded)
 
+    def iter_children(self, canonical=False, chunk_size=32):
+        """
+        :return: Generator of (actions, children) chunks of at most chunk_size children, see gogame.iter_children
+        """
+        return gogame.iter_children(self.state_, canonical, chunk_size)
+
     def winning(self):
         """
         :return: Who's currently winning in BLACK's perspective, regardless if the game is over
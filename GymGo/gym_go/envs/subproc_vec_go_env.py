@@ -0,0 +1,177 @@
+import multiprocessing as mp
+import os
+from multiprocessing import shared_memory
+
+import gym
+import numpy as np
+
+from GymGo.gym_go import govars, gogame
+from .vec_go_env import VecGoEnv
+
+
+def _shared_array(shms, shape, dtype, name=None):
+    """
+    :return: numpy array backed by a new (or, given its name, an existing) shared memory block
+    """
+    nbytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+    shm = shared_memory.SharedMemory(name=name, create=name is None, size=nbytes)
+    shms.append(shm)
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _worker(remote, layout, start, stop, env_kwargs):
+    """
+    Steps the games [start, stop) with a VecGoEnv, exchanging their states, actions, rewards and dones
+    through the shared arrays described by layout. Only the commands and acknowledgements go through remote
+    """
+    shms = []
+    arrays = {key: _shared_array(shms, shape, dtype, name)[start:stop]
+              for key, (name, shape, dtype) in layout.items()}
+    env = VecGoEnv(stop - start, **env_kwargs)
+    try:
+        while True:
+            cmd = remote.recv()
+            if cmd == 'step':
+                _, rewards, dones, info = env.step(arrays['actions'])
+                arrays['rewards'][:] = rewards
+                arrays['dones'][:] = dones
+                arrays['final_states'][dones] = info['final_states']
+            elif cmd == 'reset':
+                env.reset()
+            else:
+                break
+            arrays['states'][:] = env.states_
+            arrays['valid_moves'][:] = env.valid_moves()
+            remote.send(None)
+    finally:
+        del arrays
+        for shm in shms:
+            shm.close()
+        remote.close()
+
+
+class SubprocVecGoEnv(gym.Env):
+    """
+    Same API as VecGoEnv, but the games are split between num_workers processes that step their slices in parallel.
+    States, actions, rewards and dones are exchanged through multiprocessing.shared_memory arrays,
+    so nothing is pickled per step. Call close() to stop the workers and free the shared memory
+    """
+    metadata = {'render.modes': ['terminal']}
+    govars = govars
+    gogame = gogame
+
+    def __init__(self, num_envs, size, num_workers=None, komi=0, reward_method='real', dtype=np.float64):
+        '''
+        @param num_envs: number of games stepped together
+        @param num_workers: number of worker processes, defaults to the number of CPUs
+        @param reward_method: either 'heuristic' or 'real', see GoEnv
+        @param dtype: dtype of the states, np.uint8 or np.bool_ for compact states
+        '''
+        self.num_envs = num_envs
+        self.size = size
+        self.num_workers = min(num_workers or os.cpu_count(), num_envs)
+        self.observation_space = gym.spaces.Box(np.float32(0), np.float32(govars.NUM_CHNLS),
+                                                shape=(num_envs, govars.NUM_CHNLS, size, size))
+        self.action_space = gym.spaces.MultiDiscrete(np.full(num_envs, gogame.action_size(board_size=size)))
+
+        state_shape = (num_envs, govars.NUM_CHNLS, size, size)
+        specs = {
+            'states': (state_shape, dtype),
+            'final_states': (state_shape, dtype),
+            'actions': ((num_envs,), np.int64),
+            'rewards': ((num_envs,), np.float64),
+            'dones': ((num_envs,), np.bool_),
+            'valid_moves': ((num_envs, size ** 2 + 1), np.bool_),
+        }
+        self.shms = []
+        layout = {}
+        for key, (shape, array_dtype) in specs.items():
+            setattr(self, key + '_', _shared_array(self.shms, shape, array_dtype))
+            layout[key] = (self.shms[-1].name, shape, array_dtype)
+
+        env_kwargs = dict(size=size, komi=komi, reward_method=reward_method, dtype=dtype)
+        bounds = np.linspace(0, num_envs, self.num_workers + 1).astype(int)
+        self.remotes, self.processes = [], []
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            remote, worker_remote = mp.Pipe()
+            process = mp.Process(target=_worker, args=(worker_remote, layout, start, stop, env_kwargs), daemon=True)
+            process.start()
+            worker_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+        self.closed = False
+
+    def _run(self, cmd):
+        for remote in self.remotes:
+            remote.send(cmd)
+        for remote in self.remotes:
+            remote.recv()
+
+    def reset(self):
+        '''
+        Reset all the games, return states
+        '''
+        self._run('reset')
+        return np.copy(self.states_)
+
+    def step(self, actions):
+        '''
+        Plays one 1D action (SIZE**2 for passing) in every game, see VecGoEnv.step
+        return states, rewards, dones, info
+        '''
+        self.actions_[:] = actions
+        self._run('step')
+        dones = np.copy(self.dones_)
+        info = {
+            'turn': gogame.batch_turn(self.states_),
+            'valid_moves': np.copy(self.valid_moves_),
+            'final_states': self.final_states_[dones],
+        }
+        return np.copy(self.states_), np.copy(self.rewards_), dones, info
+
+    def turn(self):
+        return gogame.batch_turn(self.states_)
+
+    def valid_moves(self):
+        """
+        :return: (NUM_ENVS, ACTION_SIZE) bool valid moves masks, passing is always valid
+        """
+        return np.copy(self.valid_moves_)
+
+    def uniform_random_action(self):
+        """
+        :return: (NUM_ENVS,) uniformly random valid 1D actions
+        """
+        return np.argmax(np.random.rand(*self.valid_moves_.shape) * self.valid_moves_, axis=1)
+
+    def states(self):
+        """
+        :return: copy of the states
+        """
+        return np.copy(self.states_)
+
+    def close(self):
+        if self.closed:
+            return
+        for remote in self.remotes:
+            remote.send('close')
+            remote.close()
+        for process in self.processes:
+            process.join()
+        for key in ['states', 'final_states', 'actions', 'rewards', 'dones', 'valid_moves']:
+            delattr(self, key + '_')
+        for shm in self.shms:
+            shm.close()
+            shm.unlink()
+        self.closed = True
+
+    def __del__(self):
+        if hasattr(self, 'closed'):
+            self.close()
+
+    def __str__(self):
+        return '\n'.join(gogame.str(state) for state in self.states_)
+
+    def render(self, mode='terminal'):
+        assert mode == 'terminal'
+        print(self.__str__())
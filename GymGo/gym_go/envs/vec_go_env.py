@@ -0,0 +1,113 @@
+import gym
+import numpy as np
+
+from GymGo.gym_go import govars, gogame
+from .go_env import RewardMethod
+
+
+class VecGoEnv(gym.Env):
+    """
+    num_envs games of Go held in one (NUM_ENVS, NUM_CHNLS, SIZE, SIZE) array and stepped together in lockstep
+    with gogame.batch_next_states. Finished games are reset automatically
+    """
+    metadata = {'render.modes': ['terminal']}
+    govars = govars
+    gogame = gogame
+
+    def __init__(self, num_envs, size, komi=0, reward_method='real', dtype=np.float64):
+        '''
+        @param num_envs: number of games stepped together
+        @param reward_method: either 'heuristic' or 'real', see GoEnv
+        @param dtype: dtype of the states, np.uint8 or np.bool_ for compact states
+        '''
+        self.num_envs = num_envs
+        self.size = size
+        self.komi = komi
+        self.dtype = dtype
+        self.states_ = gogame.batch_init_state(num_envs, size, dtype)
+        self.reward_method = RewardMethod(reward_method)
+        self.observation_space = gym.spaces.Box(np.float32(0), np.float32(govars.NUM_CHNLS),
+                                                shape=(num_envs, govars.NUM_CHNLS, size, size))
+        self.action_space = gym.spaces.MultiDiscrete(np.full(num_envs, gogame.action_size(board_size=size)))
+
+    def reset(self):
+        '''
+        Reset all the games, return states
+        '''
+        self.states_ = gogame.batch_init_state(self.num_envs, self.size, self.dtype)
+        return np.copy(self.states_)
+
+    def step(self, actions):
+        '''
+        Plays one 1D action (SIZE**2 for passing) in every game. Black goes first.
+        Games that end are reset, their final states are in info['final_states']
+        return states, rewards, dones, info
+        '''
+        actions = np.asarray(actions)
+        assert actions.shape == (self.num_envs,)
+        self.states_ = gogame.batch_next_states(self.states_, actions)
+        dones = gogame.batch_game_ended(self.states_).astype(bool)
+        rewards = self.rewards(dones)
+
+        final_states = self.states_[dones]
+        self.states_[dones] = 0
+        info = {
+            'turn': gogame.batch_turn(self.states_),
+            'valid_moves': self.valid_moves(),
+            'final_states': final_states,
+        }
+        return np.copy(self.states_), rewards, dones, info
+
+    def turn(self):
+        return gogame.batch_turn(self.states_)
+
+    def valid_moves(self):
+        """
+        :return: (NUM_ENVS, ACTION_SIZE) bool valid moves masks, passing is always valid
+        """
+        valid_moves = np.ones((self.num_envs, self.size ** 2 + 1), dtype=bool)
+        valid_moves[:, :-1] = self.states_[:, govars.INVD_CHNL].reshape(self.num_envs, -1) == 0
+        return valid_moves
+
+    def uniform_random_action(self):
+        """
+        :return: (NUM_ENVS,) uniformly random valid 1D actions
+        """
+        return np.argmax(np.random.rand(self.num_envs, self.size ** 2 + 1) * self.valid_moves(), axis=1)
+
+    def states(self):
+        """
+        :return: copy of the states
+        """
+        return np.copy(self.states_)
+
+    def canonical_states(self):
+        """
+        :return: canonical copy of the states
+        """
+        return gogame.batch_canonical_form(self.states_)
+
+    def rewards(self, dones):
+        '''
+        Rewards of the current states based on reward_method, see GoEnv.reward
+        :param dones: (NUM_ENVS,) bool, whether each game just ended
+        '''
+        rewards = np.zeros(self.num_envs)
+        if self.reward_method == RewardMethod.REAL:
+            if dones.any():
+                rewards[dones] = gogame.batch_winning(self.states_[dones], self.komi)
+
+        elif self.reward_method == RewardMethod.HEURISTIC:
+            black_areas, white_areas = gogame.batch_areas(self.states_)
+            rewards[:] = black_areas - white_areas - self.komi
+            rewards[dones] = np.where(rewards[dones] > 0, 1, -1) * self.size ** 2
+        else:
+            raise Exception("Unknown Reward Method")
+        return rewards
+
+    def __str__(self):
+        return '\n'.join(gogame.str(state) for state in self.states_)
+
+    def render(self, mode='terminal'):
+        assert mode == 'terminal'
+        print(self.__str__())
@@ -1,8 +1,9 @@
+import os
+from functools import lru_cache
+
 import numpy as np
-from scipy import ndimage
-from sklearn import preprocessing
 
-from GymGo.gym_go import state_utils, govars
+from GymGo.gym_go import state_utils, govars, bitboard, zobrist
 
 """
 The state of the game is a numpy array
@@ -24,37 +25,56 @@ CHANNEL[4]: 上一步是否为PASS，一个全0或全1的矩阵。0：不是PASS
 CHANNEL[5]: 上一步落子后，游戏是否结束，一个全0或全1的矩阵。0：未结束，1：已结束。
 """
 
+# Rules backend of next_state and areas: 'ndimage' (scipy labelling) or 'bitboard' (see bitboard.py)
+BACKEND = os.environ.get('GYM_GO_BACKEND', 'ndimage')
+assert BACKEND in ['ndimage', 'bitboard'], BACKEND
+
 
-def init_state(size):
+def init_state(size, dtype=np.float64):
     # return initial board (numpy board)
-    state = np.zeros((govars.NUM_CHNLS, size, size))
+    # 所有通道均为0/1，dtype可取np.uint8或np.bool_以节省内存，next_state等函数均保持state的dtype
+    state = np.zeros((govars.NUM_CHNLS, size, size), dtype=dtype)
     return state
 
 
-def batch_init_state(batch_size, board_size):
+def batch_init_state(batch_size, board_size, dtype=np.float64):
     # return initial board (numpy board)
-    batch_state = np.zeros((batch_size, govars.NUM_CHNLS, board_size, board_size))
+    batch_state = np.zeros((batch_size, govars.NUM_CHNLS, board_size, board_size), dtype=dtype)
     return batch_state
 
 
-def next_state(state, action1d, canonical=False):
+def next_state(state, action1d, canonical=False, board=None):
+    """
+    :param state:
+    :param action1d:
+    :param canonical:
+    :param board: Optional board.Board of the state. If given, it is advanced in place and used to find the
+    killed groups and the invalid moves, instead of labelling the whole board. A board with superko also marks
+    the moves that repeat a position of its game as invalid
+    :return: The next state
+    """
+    if board is None and BACKEND == 'bitboard':
+        return bitboard.next_state(state, action1d, canonical)
+
     # Deep copy the state to modify
     state = np.copy(state)
 
     # Initialize basic variables
-    board_shape = state.shape[1:]  # state.shape为(通道数, 棋盘高度, 棋盘宽度)
-    pass_idx = np.prod(board_shape)  # np.prod()将参数内所有元素连乘，pass_idx："pass"对应的id
-    passed = action1d == pass_idx  # 如果action id等于pass_idx，则passed为True
-    action2d = action1d // board_shape[0], action1d % board_shape[1]  # 将action1d转换成action2d
+    geo = state_utils.geometry(state.shape[1])  # 该棋盘大小的预计算索引表
+    passed = action1d == geo.pass_idx  # 如果action id等于pass_idx（"pass"对应的id），则passed为True
+    action2d = None if passed else tuple(geo.coords[action1d])  # 将action1d转换成action2d
 
     player = turn(state)  # 获取下一步落子方
     previously_passed = prev_player_passed(state)  # 获取上一步是否为pass
     ko_protect = None
+    analysis = None
 
     if passed:
         # We passed
         # 如果下一步为pass，则将next_state中PASS_CHNL矩阵置为全1矩阵
         state[govars.PASS_CHNL] = 1
+        if board is not None:
+            board.play(action1d)
         if previously_passed:
             # Game ended
             # 如果上一步也为pass，则游戏结束【双方连续各pass，则游戏结束】
@@ -70,23 +90,33 @@ def next_state(state, action1d, canonical=False):
         # Add piece
         state[player, action2d[0], action2d[1]] = 1
 
-        # Get adjacent location and check whether the piece will be surrounded by opponent's piece
-        # 获取下一步落子位置的相邻位置（仅在棋盘内）、下一步落子位置是否被下一步落子方对手的棋子包围
-        adj_locs, surrounded = state_utils.adj_data(state, action2d, player)
-
-        # Update pieces
-        # 更新棋盘黑白棋子分布矩阵，并返回各组被杀死的棋子列表
-        killed_groups = state_utils.update_pieces(state, adj_locs, player)
-
-        # If only killed one group, and that one group was one piece, and piece set is surrounded,
-        # activate ko protection
-        if len(killed_groups) == 1 and surrounded:
-            killed_group = killed_groups[0]
-            if len(killed_group) == 1:
-                ko_protect = killed_group[0]
+        if board is not None:
+            # 由board增量地更新棋子块及其气，只需处理落子位置及被提棋子的邻域
+            for killed_group in board.play(action1d):
+                state[1 - player].flat[killed_group] = 0
+        else:
+            # Get adjacent location and check whether the piece will be surrounded by opponent's piece
+            # 获取下一步落子位置的相邻位置（仅在棋盘内）、下一步落子位置是否被下一步落子方对手的棋子包围
+            adj_locs, surrounded = state_utils.adj_data(state, action2d, player)
+
+            # Update pieces
+            # 更新棋盘黑白棋子分布矩阵，并返回各组被杀死的棋子列表
+            # analysis对黑白棋子各标记一次棋子块，提子及计算无效落子位置时共用
+            analysis = state_utils.BoardAnalysis(state)
+            killed_groups = state_utils.update_pieces(state, adj_locs, player, analysis)
+
+            # If only killed one group, and that one group was one piece, and piece set is surrounded,
+            # activate ko protection
+            if len(killed_groups) == 1 and surrounded:
+                killed_group = killed_groups[0]
+                if len(killed_group) == 1:
+                    ko_protect = killed_group[0]
 
     # Update invalid moves
-    state[govars.INVD_CHNL] = state_utils.compute_invalid_moves(state, player, ko_protect)
+    if board is not None:
+        state[govars.INVD_CHNL] = board.invalid_moves()
+    else:
+        state[govars.INVD_CHNL] = state_utils.compute_invalid_moves(state, player, ko_protect, analysis)
 
     # Switch turn
     # 设置下一步落子方
@@ -101,25 +131,32 @@ def next_state(state, action1d, canonical=False):
     return state
 
 
-def batch_next_states(batch_states, batch_action1d, canonical=False):
+def batch_next_states(batch_states, batch_action1d, canonical=False, batch_hashes=None, batch_kos=None):
+    """
+    :param batch_states:
+    :param batch_action1d:
+    :param canonical:
+    :param batch_hashes: Optional (BATCH_SIZE,) uint64 Zobrist hashes of batch_states (see zobrist.py).
+    Updated in place, along with batch_kos, the (BATCH_SIZE,) 1D ko-protected points (-1 for none)
+    :return: The next states
+    """
     # Deep copy the state to modify
     batch_states = np.copy(batch_states)
 
     # Initialize basic variables
     board_shape = batch_states.shape[2:]
-    pass_idx = np.prod(board_shape)
+    geo = state_utils.geometry(board_shape[0])
+    pass_idx = geo.pass_idx
     batch_pass = np.nonzero(batch_action1d == pass_idx)
     batch_non_pass = np.nonzero(batch_action1d != pass_idx)[0]
     batch_prev_passed = batch_prev_player_passed(batch_states)
     batch_game_ended = np.nonzero(batch_prev_passed & (batch_action1d == pass_idx))
-    batch_action2d = np.array([batch_action1d[batch_non_pass] // board_shape[0],
-                               batch_action1d[batch_non_pass] % board_shape[1]]).T
-    # batch_action2d在.T之前是一个shape为(2, batch_size)的二维数组，第一行代表所有非pass动作的坐标行号，
-    # 第二行代表所有非pass动作列号。因此需要.T进行转置
+    # batch_action2d为shape为(batch_size, 2)的二维数组，每行为一个非pass动作的坐标行号及列号
+    batch_action2d = geo.coords[batch_action1d[batch_non_pass]]
 
     batch_players = batch_turn(batch_states)
     batch_non_pass_players = batch_players[batch_non_pass]
-    batch_ko_protect = np.empty(len(batch_states), dtype=object)
+    batch_ko_protect = np.full(len(batch_states), -1)
 
     # Pass moves
     batch_states[batch_pass, govars.PASS_CHNL] = 1
@@ -140,21 +177,33 @@ def batch_next_states(batch_states, batch_action1d, canonical=False):
                                                                   batch_non_pass_players)
 
     # Update pieces
-    batch_killed_groups = state_utils.batch_update_pieces(batch_non_pass, batch_states, batch_adj_locs,
-                                                          batch_non_pass_players)
+    # 整个batch的黑白棋子各只标记一次棋子块，提子及计算无效落子位置时共用
+    analysis = state_utils.BatchBoardAnalysis(batch_states)
+    batch_killed, batch_num_killed = state_utils.batch_update_pieces(batch_non_pass, batch_states, batch_adj_locs,
+                                                                     batch_non_pass_players, analysis)
+    batch_killed = batch_killed.reshape(len(batch_non_pass), pass_idx)
 
     # Ko-protection
-    for i, (killed_groups, surrounded) in enumerate(zip(batch_killed_groups, batch_surrounded)):
-        # If only killed one group, and that one group was one piece, and piece set is surrounded,
-        # activate ko protection
-        if len(killed_groups) == 1 and surrounded:
-            killed_group = killed_groups[0]
-            if len(killed_group) == 1:
-                batch_ko_protect[batch_non_pass[i]] = killed_group[0]
+    # If only killed one group, and that one group was one piece, and piece set is surrounded,
+    # activate ko protection
+    batch_ko = (batch_num_killed == 1) & (np.sum(batch_killed, axis=1) == 1) & batch_surrounded
+    batch_ko_protect[batch_non_pass[batch_ko]] = np.argmax(batch_killed[batch_ko], axis=1)
+
+    if batch_hashes is not None:
+        # Hashes follow the actual (non-canonical) colors
+        assert not canonical
+        keys = zobrist.get_keys(board_shape[0])
+        # Switch turn, lift the previous ko-protection and set the new one
+        batch_hashes ^= keys.turn ^ keys.ko[batch_kos] ^ keys.ko[batch_ko_protect]
+        batch_kos[:] = batch_ko_protect
+        # Add the pieces and remove the killed ones
+        batch_hashes[batch_non_pass] ^= keys.pieces[batch_non_pass_players, batch_action1d[batch_non_pass]]
+        killed_keys = np.where(batch_killed, keys.pieces[1 - batch_non_pass_players], np.uint64(0))
+        batch_hashes[batch_non_pass] ^= np.bitwise_xor.reduce(killed_keys, axis=1)
 
     # Update invalid moves
     batch_states[:, govars.INVD_CHNL] = state_utils.batch_compute_invalid_moves(batch_states, batch_players,
-                                                                                batch_ko_protect)
+                                                                                batch_ko_protect, analysis)
 
     # Switch turn
     state_utils.batch_set_turn(batch_states)
@@ -189,17 +238,31 @@ def batch_valid_moves(batch_state):
 
 
 def children(state, canonical=False, padded=True):
-    valid_moves_bool = valid_moves(state)
-    n = len(valid_moves_bool)
-    valid_move_idcs = np.argwhere(valid_moves_bool).flatten()
-    batch_states = np.tile(state[np.newaxis], (len(valid_move_idcs), 1, 1, 1))
-    children = batch_next_states(batch_states, valid_move_idcs, canonical)
-
     if padded:
-        padded_children = np.zeros((n, *state.shape))
-        padded_children[valid_move_idcs] = children
-        children = padded_children
-    return children
+        # Fill the padded array chunk by chunk, without holding all the children twice
+        children = np.zeros((action_size(state), *state.shape), dtype=state.dtype)
+        for actions, chunk in iter_children(state, canonical):
+            children[actions] = chunk
+        return children
+
+    valid_move_idcs = np.flatnonzero(valid_moves(state))
+    batch_states = np.broadcast_to(state, (len(valid_move_idcs), *state.shape))
+    return batch_next_states(batch_states, valid_move_idcs, canonical)
+
+
+def iter_children(state, canonical=False, chunk_size=32):
+    """
+    Generates the children of the valid moves in chunks, holding at most chunk_size children at once
+    :param state:
+    :param canonical:
+    :param chunk_size: Number of children computed per batch_next_states call. 1 streams them one by one
+    :return: A generator of (actions, children), the 1D actions of a chunk and their next states
+    """
+    valid_move_idcs = np.flatnonzero(valid_moves(state))
+    for start in range(0, len(valid_move_idcs), chunk_size):
+        actions = valid_move_idcs[start:start + chunk_size]
+        batch_states = np.broadcast_to(state, (len(actions), *state.shape))
+        yield actions, batch_next_states(batch_states, actions, canonical)
 
 
 def action_size(state=None, board_size: int = None):
@@ -271,6 +334,7 @@ def liberties(state: np.ndarray):
     whites = state[govars.WHITE]
     all_pieces = np.sum(state[[govars.BLACK, govars.WHITE]], axis=0)
 
+    from scipy import ndimage
     liberty_list = []
     for player_pieces in [blacks, whites]:
         liberties = ndimage.binary_dilation(player_pieces, state_utils.surround_struct)
@@ -292,38 +356,52 @@ def areas(state):
     '''
     Return black area, white area
     '''
+    if BACKEND == 'bitboard':
+        return bitboard.areas(state)
 
-    all_pieces = np.sum(state[[govars.BLACK, govars.WHITE]], axis=0)
-    empties = 1 - all_pieces
+    return state_utils.BoardAnalysis(state, label_groups=False).areas()
 
-    empty_labels, num_empty_areas = ndimage.measurements.label(empties)
 
-    black_area, white_area = np.sum(state[govars.BLACK]), np.sum(state[govars.WHITE])
-    for label in range(1, num_empty_areas + 1):
-        empty_area = empty_labels == label
-        neighbors = ndimage.binary_dilation(empty_area)
-        black_claim = False
-        white_claim = False
-        if (state[govars.BLACK] * neighbors > 0).any():
-            black_claim = True
-        if (state[govars.WHITE] * neighbors > 0).any():
-            white_claim = True
-        if black_claim and not white_claim:
-            black_area += np.sum(empty_area)
-        elif white_claim and not black_claim:
-            white_area += np.sum(empty_area)
+def pass_alive(state):
+    """
+    Benson's pass-alive groups and the territory they settle, see state_utils.BoardAnalysis.pass_alive
+    Cached per position (pieces only)
+    :param state:
+    :return: Read-only (2, SIZE, SIZE) bool arrays of the pass-alive pieces and of the territory of each colour
+    """
+    return _pass_alive((state[[govars.BLACK, govars.WHITE]] > 0).tobytes(), state.shape[1])
 
-    return black_area, white_area
 
+@lru_cache(maxsize=4096)
+def _pass_alive(pieces, size):
+    state = np.zeros((govars.NUM_CHNLS, size, size), dtype=bool)
+    state[[govars.BLACK, govars.WHITE]] = np.frombuffer(pieces, dtype=bool).reshape(2, size, size)
+    analysis = state_utils.BoardAnalysis(state)
+    alive, territory = map(np.array, zip(*[analysis.pass_alive(color) for color in [govars.BLACK, govars.WHITE]]))
+    alive.flags.writeable = False
+    territory.flags.writeable = False
+    return alive, territory
 
-def batch_areas(batch_state):
-    black_areas, white_areas = [], []
 
-    for state in batch_state:
-        ba, wa = areas(state)
-        black_areas.append(ba)
-        white_areas.append(wa)
-    return np.array(black_areas), np.array(white_areas)
+def settled_areas(state):
+    """
+    Exact areas once every point is settled by pass_alive, i.e. a pass-alive piece or territory.
+    The dead pieces in a territory count for its owner
+    :param state:
+    :return: black area, white area, or None if some point is not settled yet
+    """
+    alive, territory = pass_alive(state)
+    owned = alive | territory
+    if not owned.any(axis=0).all():
+        return None
+    return np.sum(owned[govars.BLACK]), np.sum(owned[govars.WHITE])
+
+
+def batch_areas(batch_state):
+    '''
+    Return black areas, white areas of the whole batch at once
+    '''
+    return state_utils.BatchBoardAnalysis(batch_state, label_groups=False).areas()
 
 
 def canonical_form(state):
@@ -338,18 +416,14 @@ def canonical_form(state):
 
 
 def batch_canonical_form(batch_state):
-    batch_state = np.copy(batch_state)
+    # Swap the black and white channels of the states where white is to move, in one gather
     batch_player = batch_turn(batch_state)
-    white_players_idcs = np.nonzero(batch_player == govars.WHITE)[0]
-
-    channels = np.arange(govars.NUM_CHNLS)
-    channels[govars.BLACK] = govars.WHITE
-    channels[govars.WHITE] = govars.BLACK
-
-    for i in white_players_idcs:
-        batch_state[i] = batch_state[i, channels]
-        batch_state[i, govars.TURN_CHNL] = 1 - batch_player[i]
+    channels = np.tile(np.arange(govars.NUM_CHNLS), (len(batch_state), 1))
+    channels[batch_player == govars.WHITE, govars.BLACK] = govars.WHITE
+    channels[batch_player == govars.WHITE, govars.WHITE] = govars.BLACK
 
+    batch_state = batch_state[np.arange(len(batch_state))[:, np.newaxis], channels]
+    batch_state[:, govars.TURN_CHNL] = 0
     return batch_state
 
 
@@ -360,18 +434,7 @@ def random_symmetry(image):
     :return:
     """
     orientation = np.random.randint(0, 8)
-
-    if (orientation >> 0) % 2:
-        # Horizontal flip
-        image = np.flip(image, 2)
-    if (orientation >> 1) % 2:
-        # Vertical flip
-        image = np.flip(image, 1)
-    if (orientation >> 2) % 2:
-        # Rotate 90 degrees
-        image = np.rot90(image, axes=(1, 2))
-
-    return image
+    return batch_symmetry(image[np.newaxis], np.array([orientation]))[0]
 
 
 def all_symmetries(image):
@@ -380,22 +443,55 @@ def all_symmetries(image):
     :return: All 8 orientations that are symmetrical in a Go game over the 2nd and 3rd axes
     (i.e. rotations, flipping and combos of them)
     """
-    symmetries = []
+    return list(batch_symmetries(image[np.newaxis])[0])
+
+
+def batch_symmetries(batch_image):
+    """
+    All 8 orientations of every image, gathered at once with the tables of state_utils.symmetry_table
+    :param batch_image: A (BATCH_SIZE, C, BOARD_SIZE, BOARD_SIZE) numpy array
+    :return: A (BATCH_SIZE, 8, C, BOARD_SIZE, BOARD_SIZE) numpy array, in the order of all_symmetries
+    """
+    b, c, m, n = batch_image.shape
+    table = state_utils.symmetry_table(m)[:, :-1]
+    symmetries = batch_image.reshape(b, c, m * n)[:, :, table]
+    return symmetries.reshape(b, c, 8, m, n).swapaxes(1, 2)
+
+
+def batch_policy_symmetries(batch_policy):
+    """
+    :param batch_policy: A (BATCH_SIZE, BOARD_SIZE ** 2 + 1) numpy array, e.g. move probabilities
+    :return: A (BATCH_SIZE, 8, BOARD_SIZE ** 2 + 1) numpy array, in the order of batch_symmetries. Pass stays last
+    """
+    size = int(round(np.sqrt(batch_policy.shape[1] - 1)))
+    return batch_policy[:, state_utils.symmetry_table(size)]
 
-    for i in range(8):
-        x = image
-        if (i >> 0) % 2:
-            # Horizontal flip
-            x = np.flip(x, 2)
-        if (i >> 1) % 2:
-            # Vertical flip
-            x = np.flip(x, 1)
-        if (i >> 2) % 2:
-            # Rotation 90 degrees
-            x = np.rot90(x, axes=(1, 2))
-        symmetries.append(x)
 
-    return symmetries
+def batch_symmetry(batch_image, batch_orientation, inverse=False):
+    """
+    :param batch_image: A (BATCH_SIZE, C, BOARD_SIZE, BOARD_SIZE) numpy array
+    :param batch_orientation: (BATCH_SIZE,) orientations in [0, 8), in the order of all_symmetries
+    :param inverse: Map images of the given orientations back to the original orientation
+    :return: The given orientation of every image
+    """
+    b, c, m, n = batch_image.shape
+    table = state_utils.symmetry_table(m, inverse)[batch_orientation, :-1]
+    symmetry = batch_image.reshape(b, c, m * n)[np.arange(b)[:, np.newaxis, np.newaxis],
+                                                np.arange(c)[np.newaxis, :, np.newaxis], table[:, np.newaxis]]
+    return symmetry.reshape(b, c, m, n)
+
+
+def batch_policy_symmetry(batch_policy, batch_orientation, inverse=False):
+    """
+    :param batch_policy: A (BATCH_SIZE, BOARD_SIZE ** 2 + 1) numpy array
+    :param batch_orientation: (BATCH_SIZE,) orientations in [0, 8), in the order of all_symmetries
+    :param inverse: Map policies of the given orientations back to the original orientation,
+    e.g. to average symmetric network outputs
+    :return: The given orientation of every policy
+    """
+    size = int(round(np.sqrt(batch_policy.shape[1] - 1)))
+    table = state_utils.symmetry_table(size, inverse)[batch_orientation]
+    return np.take_along_axis(batch_policy, table, axis=1)
 
 
 def random_weighted_action(move_weights):
@@ -404,8 +500,8 @@ def random_weighted_action(move_weights):
     Action is 1D
     Expected shape is (NUM OF MOVES, )
     """
-    move_weights = preprocessing.normalize(move_weights[np.newaxis], norm='l1')
-    return np.random.choice(np.arange(len(move_weights[0])), p=move_weights[0])
+    move_weights = move_weights / np.sum(np.abs(move_weights))
+    return np.random.choice(np.arange(len(move_weights)), p=move_weights)
 
 
 def random_action(state):
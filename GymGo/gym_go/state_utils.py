@@ -1,9 +1,14 @@
+from functools import lru_cache
+
 import numpy as np
-from scipy import ndimage
-from scipy.ndimage import measurements
 
 from GymGo.gym_go import govars
 
+"""
+scipy is imported where it is used, so that the bitboard backend and the incremental Board,
+which do not label with scipy, don't pay its import
+"""
+
 group_struct = np.array([[[0, 0, 0],
                           [0, 0, 0],
                           [0, 0, 0]],
@@ -19,9 +24,387 @@ surround_struct = np.array([[0, 1, 0],
                             [0, 1, 0]])
 
 neighbor_deltas = np.array([[-1, 0], [1, 0], [0, -1], [0, 1]])
+diagonal_deltas = np.array([[-1, -1], [-1, 1], [1, -1], [1, 1]])
+
+
+class Geometry:
+    """
+    Index tables of a size x size board, built once per board size (see geometry)
+    1D indices are row * size + col. Index size ** 2, the pass, doubles as the off-board sentinel
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.pass_idx = size ** 2
+        # (row, col) of every 1D index, and 1D index of every (row, col)
+        self.coords = np.indices((size, size)).reshape(2, -1).T
+        self.idcs = np.arange(size ** 2).reshape(size, size)
+        # 1D indices of the 4 adjacent and the 4 diagonal points of every point, (size ** 2, 4) each
+        self.neighbors = self._table(neighbor_deltas)
+        self.diagonals = self._table(diagonal_deltas)
+        # Points on the side or in the corner of the board
+        self.on_side = np.zeros((size, size), dtype=bool)
+        self.on_side[[0, -1], :] = True
+        self.on_side[:, [0, -1]] = True
+
+        for table in [self.coords, self.idcs, self.neighbors, self.diagonals, self.on_side]:
+            table.flags.writeable = False
+
+    def _table(self, deltas):
+        points = self.coords[:, np.newaxis] + deltas[np.newaxis]
+        on_board = ((points >= 0) & (points < self.size)).all(axis=2)
+        return np.where(on_board, points[:, :, 0] * self.size + points[:, :, 1], self.pass_idx)
+
+
+@lru_cache(maxsize=None)
+def geometry(size):
+    return Geometry(size)
+
 
+def neighbor_table(size):
+    """
+    1D indices of the 4 neighbors of every point on a size x size board
+    :param size:
+    :return: A (size ** 2, 4) int array. Off-board neighbors point to the sentinel index size ** 2
+    """
+    return geometry(size).neighbors
+
+
+@lru_cache(maxsize=None)
+def symmetry_table(size, inverse=False):
+    """
+    Gather indices of the 8 dihedral symmetries of a size x size board, in the order of gogame.all_symmetries.
+    The pass index size ** 2 maps to itself, so the table applies to policies of size ** 2 + 1 too
+    :param size:
+    :param inverse: The tables that map each orientation back to the original
+    :return: A (8, size ** 2 + 1) int array. Orientation i of a flat image x is x[table[i]]
+    """
+    table = np.empty((8, size ** 2 + 1), dtype=np.int64)
+    idcs = np.arange(size ** 2).reshape(size, size)
+    for i in range(8):
+        x = idcs
+        if (i >> 0) % 2:
+            # Horizontal flip
+            x = np.flip(x, 1)
+        if (i >> 1) % 2:
+            # Vertical flip
+            x = np.flip(x, 0)
+        if (i >> 2) % 2:
+            # Rotation 90 degrees
+            x = np.rot90(x)
+        table[i, :-1] = x.flatten()
+    table[:, -1] = size ** 2
+    if inverse:
+        table = np.argsort(table, axis=1)
+    table.flags.writeable = False
+    return table
+
+
+class BoardAnalysis:
+    """
+    Groups and liberties of a state, shared by the rule computations of that state
+    Each colour is labelled once. The liberty counts of all groups come from one np.bincount over the
+    (group label, neighboring empty point) pairs, read off the neighbor table.
+
+    Labels are 1D with the sentinel index size ** 2 appended, so they can be indexed by neighbor_table rows.
+    Label 0 means no piece of that colour.
+    """
+
+    def __init__(self, state, label_groups=True):
+        """
+        :param state:
+        :param label_groups: False skips the labelling of the groups and their liberties, when only the areas are needed
+        """
+        self.size = state.shape[1]
+        self.geometry = geometry(self.size)
+        self.neighbors = self.geometry.neighbors
+
+        self.pieces = state[[govars.BLACK, govars.WHITE]] > 0
+        self.empties = ~(self.pieces[govars.BLACK] | self.pieces[govars.WHITE])
+
+        self.labels = np.zeros((2, self.size ** 2 + 1), dtype=np.int64)
+        self.num_labels = [0, 0]
+        self.liberty_counts = [None, None]
+        if label_groups:
+            from scipy import ndimage
+            for color in [govars.BLACK, govars.WHITE]:
+                labels, self.num_labels[color] = ndimage.label(self.pieces[color])
+                self.labels[color, :-1] = labels.flatten()
+            self._count_liberties()
+
+    def _count_liberties(self):
+        empty_neighbors = self.neighbors[np.flatnonzero(self.empties)]
+        for color in [govars.BLACK, govars.WHITE]:
+            # Count every empty point once per adjacent group
+            liberty_labels = np.sort(self.labels[color, empty_neighbors], axis=1)
+            first = liberty_labels > 0
+            first[:, 1:] &= liberty_labels[:, 1:] != liberty_labels[:, :-1]
+            self.liberty_counts[color] = np.bincount(liberty_labels[first], minlength=self.num_labels[color] + 1)
+
+    def adjacent_labels(self, color, idcs):
+        """
+        :return: The labels of the groups of color next to the 1D indices idcs, shape (len(idcs), 4)
+        """
+        return self.labels[color, self.neighbors[idcs]]
+
+    def killed_groups(self, color, idcs):
+        """
+        Removes the groups of color without liberties that have a piece at one of the 1D indices idcs
+        :return: The labels of the removed groups
+        """
+        adj_labels = np.unique(self.labels[color, idcs])
+        killed_labels = adj_labels[(adj_labels > 0) & (self.liberty_counts[color][adj_labels] == 0)]
+        if len(killed_labels) > 0:
+            killed = np.isin(self.labels[color, :-1], killed_labels).reshape(self.size, self.size)
+            self.pieces[color] &= ~killed
+            self.empties |= killed
+            self.labels[color, :-1][killed.flatten()] = 0
+            self._count_liberties()
+        return killed_labels
+
+    def surrounded(self):
+        """
+        :return: Whether every on-board neighbor of each point is a piece, as a (size, size) bool array
+        """
+        empties = np.append(self.empties.flatten(), False)
+        return ~empties[self.neighbors].any(axis=1).reshape(self.size, self.size)
+
+    def invalid_moves(self, player, ko_protect=None):
+        """
+        Invalid moves in the perspective of the opponent of player, same rules as compute_invalid_moves
+        :param player: Who just moved
+        :param ko_protect:
+        :return: A (size, size) bool array
+        """
+        own_adj_labels = self.labels[player, self.neighbors]
+        opp_adj_labels = self.labels[1 - player, self.neighbors]
+
+        # Valid if not surrounded, if it kills one of our groups,
+        # or if it connects to one of their groups with other liberties
+        valid = ~self.surrounded()
+        valid |= ((own_adj_labels > 0) & (self.liberty_counts[player][own_adj_labels] == 1)).any(axis=1) \
+            .reshape(self.size, self.size)
+        valid |= ((opp_adj_labels > 0) & (self.liberty_counts[1 - player][opp_adj_labels] > 1)).any(axis=1) \
+            .reshape(self.size, self.size)
+        invalid_moves = ~(valid & self.empties)
+
+        # Ko-protection
+        if ko_protect is not None:
+            invalid_moves[ko_protect[0], ko_protect[1]] = True
+        return invalid_moves
+
+    def areas(self):
+        """
+        :return: black area, white area. Empty areas count for a colour if they only touch pieces of that colour
+        """
+        from scipy import ndimage
+        empty_labels, num_empty_areas = ndimage.label(self.empties)
+        empty_labels = empty_labels.flatten()
+        empty_idcs = np.flatnonzero(empty_labels)
+
+        claims = []
+        for color in [govars.BLACK, govars.WHITE]:
+            pieces = np.append(self.pieces[color].flatten(), False)
+            touches = pieces[self.neighbors[empty_idcs]].any(axis=1)
+            claims.append(np.bincount(empty_labels[empty_idcs], touches, minlength=num_empty_areas + 1) > 0)
+        area_sizes = np.bincount(empty_labels, minlength=num_empty_areas + 1)
+        area_sizes[0] = 0
+
+        black_area = np.sum(self.pieces[govars.BLACK]) + np.sum(area_sizes[claims[0] & ~claims[1]])
+        white_area = np.sum(self.pieces[govars.WHITE]) + np.sum(area_sizes[claims[1] & ~claims[0]])
+        return black_area, white_area
+
+    def pass_alive(self, player):
+        """
+        Benson's algorithm: the groups of player that can never be captured, even if player always passes
+        Regions are the connected areas without pieces of player. A region is vital to a group if all its empty
+        points are liberties of the group. Groups with less than 2 vital regions, and the regions next to such
+        groups, are dropped until nothing changes. The remaining groups are pass-alive.
+        A remaining region is territory of player if each of its points is next to a pass-alive group: the opponent
+        can never make an eye there, so its pieces there are dead
+        :return: (size, size) bool arrays of the pass-alive pieces and of the territory of player
+        """
+        assert self.liberty_counts[player] is not None, "Needs the groups, label_groups=True"
+        from scipy import ndimage
+        region_labels, num_regions = ndimage.label(~self.pieces[player])
+        region_labels = region_labels.flatten()
+        num_groups = self.num_labels[player]
+
+        # (region, adjacent group) pairs of every point of the regions, each group counted once per point
+        points = np.flatnonzero(region_labels)
+        point_regions = region_labels[points]
+        adj_groups = np.sort(self.labels[player, self.neighbors[points]], axis=1)
+        first = adj_groups > 0
+        first[:, 1:] &= adj_groups[:, 1:] != adj_groups[:, :-1]
+        pair_regions = np.broadcast_to(point_regions[:, np.newaxis], adj_groups.shape)[first]
+        pair_groups = adj_groups[first]
+        pair_empty = np.broadcast_to(self.empties.flatten()[points, np.newaxis], adj_groups.shape)[first]
+
+        borders = np.zeros((num_regions + 1, num_groups + 1), dtype=bool)
+        borders[pair_regions, pair_groups] = True
+        liberties = np.zeros((num_regions + 1, num_groups + 1), dtype=np.int64)
+        np.add.at(liberties, (pair_regions[pair_empty], pair_groups[pair_empty]), 1)
+        num_empties = np.bincount(point_regions, self.empties.flatten()[points], minlength=num_regions + 1)
+        vital = borders & (liberties == num_empties[:, np.newaxis])
+
+        alive = np.arange(num_groups + 1) > 0
+        healthy = np.arange(num_regions + 1) > 0
+        while True:
+            next_alive = alive & ((vital & healthy[:, np.newaxis]).sum(axis=0) >= 2)
+            next_healthy = healthy & ~(borders & ~next_alive[np.newaxis]).any(axis=1)
+            if (next_alive == alive).all() and (next_healthy == healthy).all():
+                break
+            alive, healthy = next_alive, next_healthy
+
+        alive_pieces = alive[self.labels[player, :-1]].reshape(self.size, self.size)
+        next_to_alive = alive[adj_groups].any(axis=1)
+        settled = np.bincount(point_regions, ~next_to_alive, minlength=num_regions + 1) == 0
+        territory = np.zeros(self.size ** 2, dtype=bool)
+        territory[points] = (healthy & settled)[point_regions]
+        return alive_pieces, territory.reshape(self.size, self.size)
+
+    def eyes(self, player):
+        """
+        True eyes of player
+        1.) On the side or in the corner, all 8 neighboring points on the board have pieces of player
+        2.) Elsewhere, all 4 adjacent points and at least 3 of the 4 diagonal points have pieces of player
+        3.) The point itself is empty
+        :return: A (size, size) bool array
+        """
+        # Off-board points count as pieces of player
+        pieces = np.append(self.pieces[player].flatten(), True)
+        sides = pieces[self.neighbors].all(axis=1).reshape(self.size, self.size)
+        num_corners = pieces[self.geometry.diagonals].sum(axis=1).reshape(self.size, self.size)
+        return self.empties & sides & np.where(self.geometry.on_side, num_corners == 4, num_corners > 2)
+
+
+class BatchBoardAnalysis:
+    """
+    BoardAnalysis of a batch of states
+    Each colour of the whole batch is labelled once, group_struct keeps the games apart. White labels come after
+    the black ones, so a single np.bincount gives the liberty counts of every group of every game.
 
-def compute_invalid_moves(state, player, ko_protect=None):
+    Labels have shape (BATCH_SIZE, 2, size ** 2 + 1), the last column is the sentinel. Label 0 means no piece.
+    """
+
+    def __init__(self, batch_state, label_groups=True):
+        """
+        :param batch_state:
+        :param label_groups: False skips the labelling of the groups and their liberties, when only the areas are needed
+        """
+        self.batch_size = len(batch_state)
+        self.size = batch_state.shape[2]
+        self.neighbors = neighbor_table(self.size)
+
+        self.pieces = batch_state[:, [govars.BLACK, govars.WHITE]] > 0
+        self.empties = ~(self.pieces[:, govars.BLACK] | self.pieces[:, govars.WHITE])
+
+        self.labels = None
+        self.num_labels = 0
+        self.liberty_counts = None
+        if label_groups:
+            from scipy import ndimage
+            black_labels, num_black_labels = ndimage.label(self.pieces[:, govars.BLACK], group_struct)
+            white_labels, num_white_labels = ndimage.label(self.pieces[:, govars.WHITE], group_struct)
+            white_labels[white_labels > 0] += num_black_labels
+            self.labels = np.zeros((self.batch_size, 2, self.size ** 2 + 1), dtype=np.int64)
+            self.labels[:, govars.BLACK, :-1] = black_labels.reshape(self.batch_size, self.size ** 2)
+            self.labels[:, govars.WHITE, :-1] = white_labels.reshape(self.batch_size, self.size ** 2)
+            self.num_labels = num_black_labels + num_white_labels
+            self._count_liberties()
+
+    def _count_liberties(self):
+        games, points = np.nonzero(self.empties.reshape(self.batch_size, self.size ** 2))
+        # Labels of both colours around every empty point, each group counted once
+        liberty_labels = self.labels[games[:, np.newaxis, np.newaxis], np.arange(2)[np.newaxis, :, np.newaxis],
+                                     self.neighbors[points][:, np.newaxis]]
+        liberty_labels = np.sort(liberty_labels.reshape(len(points), 8), axis=1)
+        first = liberty_labels > 0
+        first[:, 1:] &= liberty_labels[:, 1:] != liberty_labels[:, :-1]
+        self.liberty_counts = np.bincount(liberty_labels[first], minlength=self.num_labels + 1)
+
+    def killed_groups(self, batch_idcs, batch_color, batch_adj_idcs):
+        """
+        Removes the groups without liberties of the given colour that have a piece at one of the given 1D indices,
+        for the given games
+        :param batch_idcs: (K,) games
+        :param batch_color: (K,) colour of the groups to check in each game
+        :param batch_adj_idcs: (K, M) 1D indices in each game, the sentinel index is ignored
+        :return: A (K, size ** 2) bool array of the removed pieces, and the (K,) number of removed groups
+        """
+        adj_labels = np.sort(self.labels[batch_idcs[:, np.newaxis], batch_color[:, np.newaxis], batch_adj_idcs], axis=1)
+        killed = (adj_labels > 0) & (self.liberty_counts[adj_labels] == 0)
+        killed[:, 1:] &= adj_labels[:, 1:] != adj_labels[:, :-1]
+        batch_num_killed = np.sum(killed, axis=1)
+
+        batch_killed = np.isin(self.labels[batch_idcs, batch_color, :-1], adj_labels[killed])
+        if batch_killed.any():
+            rows, killed_points = np.nonzero(batch_killed)
+            killed_games, killed_colors = batch_idcs[rows], batch_color[rows]
+            self.pieces.reshape(self.batch_size, 2, self.size ** 2)[killed_games, killed_colors, killed_points] = False
+            self.empties.reshape(self.batch_size, self.size ** 2)[killed_games, killed_points] = True
+            self.labels[killed_games, killed_colors, killed_points] = 0
+            self._count_liberties()
+        return batch_killed, batch_num_killed
+
+    def surrounded(self):
+        """
+        :return: Whether every on-board neighbor of each point is a piece, as a (BATCH_SIZE, size, size) bool array
+        """
+        empties = np.zeros((self.batch_size, self.size ** 2 + 1), dtype=bool)
+        empties[:, :-1] = self.empties.reshape(self.batch_size, self.size ** 2)
+        return ~empties[:, self.neighbors].any(axis=2).reshape(self.empties.shape)
+
+    def areas(self):
+        """
+        Same as BoardAnalysis.areas, with one 3D labelling of the empty points of the whole batch
+        :return: The (BATCH_SIZE,) black areas and white areas
+        """
+        from scipy import ndimage
+        empty_labels, num_empty_areas = ndimage.label(self.empties, group_struct)
+        games, points = np.nonzero(empty_labels.reshape(self.batch_size, self.size ** 2))
+        point_labels = empty_labels.reshape(self.batch_size, self.size ** 2)[games, points]
+
+        claims = []
+        for color in [govars.BLACK, govars.WHITE]:
+            pieces = np.zeros((self.batch_size, self.size ** 2 + 1), dtype=bool)
+            pieces[:, :-1] = self.pieces[:, color].reshape(self.batch_size, self.size ** 2)
+            touches = pieces[games[:, np.newaxis], self.neighbors[points]].any(axis=1)
+            claims.append(np.bincount(point_labels, touches, minlength=num_empty_areas + 1) > 0)
+
+        # Every empty point of an area claimed by one colour only counts for that colour
+        black_territory = np.bincount(games, (claims[0] & ~claims[1])[point_labels], minlength=self.batch_size)
+        white_territory = np.bincount(games, (claims[1] & ~claims[0])[point_labels], minlength=self.batch_size)
+        black_areas = np.sum(self.pieces[:, govars.BLACK], axis=(1, 2)) + black_territory.astype(np.int64)
+        white_areas = np.sum(self.pieces[:, govars.WHITE], axis=(1, 2)) + white_territory.astype(np.int64)
+        return black_areas, white_areas
+
+    def invalid_moves(self, batch_player, batch_ko_protect=None):
+        """
+        Invalid moves in the perspective of the opponents of batch_player, same rules as compute_invalid_moves
+        :param batch_player: (BATCH_SIZE,) who just moved in each game
+        :param batch_ko_protect: (BATCH_SIZE,) 1D index of the ko-protected point of each game, -1 for none
+        :return: A (BATCH_SIZE, size, size) bool array
+        """
+        batch_idcs = np.arange(self.batch_size)
+        own_adj_labels = self.labels[batch_idcs, batch_player][:, self.neighbors]
+        opp_adj_labels = self.labels[batch_idcs, 1 - batch_player][:, self.neighbors]
+
+        # Valid if not surrounded, if it kills one of our groups,
+        # or if it connects to one of their groups with other liberties
+        valid = ~self.surrounded().reshape(self.batch_size, self.size ** 2)
+        valid |= ((own_adj_labels > 0) & (self.liberty_counts[own_adj_labels] == 1)).any(axis=2)
+        valid |= ((opp_adj_labels > 0) & (self.liberty_counts[opp_adj_labels] > 1)).any(axis=2)
+        invalid_moves = ~(valid & self.empties.reshape(self.batch_size, self.size ** 2))
+
+        # Ko-protection
+        if batch_ko_protect is not None:
+            ko_games = np.flatnonzero(batch_ko_protect >= 0)
+            invalid_moves[ko_games, batch_ko_protect[ko_games]] = True
+        return invalid_moves.reshape(self.empties.shape)
+
+
+def compute_invalid_moves(state, player, ko_protect=None, analysis=None):
     """
     Updates invalid moves in the OPPONENT's perspective
     1.) Opponent cannot move at a location
@@ -34,65 +417,14 @@ def compute_invalid_moves(state, player, ko_protect=None):
             not adjacent to other groups with more than one liberty and is completely surrounded
         ii.) If it's surrounded by our pieces and all of those corresponding groups
             move more than one liberty
+    :param analysis: Optional BoardAnalysis of state, to reuse its groups and liberties
     """
+    if analysis is None:
+        analysis = BoardAnalysis(state)
+    return analysis.invalid_moves(player, ko_protect)
+
 
-    # All pieces and empty spaces
-    # 棋盘所有有棋子的分布矩阵，有棋子的位置为1
-    all_pieces = np.sum(state[[govars.BLACK, govars.WHITE]], axis=0)
-    # 棋盘上所有空交叉点的分布矩阵，空交叉点位置为1
-    empties = 1 - all_pieces
-
-    # Setup invalid and valid arrays
-    possible_invalid_array = np.zeros(state.shape[1:])
-    definite_valids_array = np.zeros(state.shape[1:])
-
-    # Get all groups
-    # 上一步落子方各块棋子分布矩阵，及棋子块数
-    all_own_groups, num_own_groups = measurements.label(state[player])
-    # 下一步落子方各块棋子分布矩阵，及棋子块数
-    all_opp_groups, num_opp_groups = measurements.label(state[1 - player])
-    expanded_own_groups = np.zeros((num_own_groups, *state.shape[1:]))
-    expanded_opp_groups = np.zeros((num_opp_groups, *state.shape[1:]))
-
-    # Expand the groups such that each group is in its own channel
-    for i in range(num_own_groups):
-        expanded_own_groups[i] = all_own_groups == (i + 1)
-
-    for i in range(num_opp_groups):
-        expanded_opp_groups[i] = all_opp_groups == (i + 1)
-
-    # Get all liberties in the expanded form
-    # 计算每一块棋子的气分布矩阵
-    # 其中np.newaxis == None，matrix[None]意思是在第0维增加一个维度
-    # all_own_liberties和all_opp_liberties均是三维矩阵，代表每块棋子的气的分布
-    all_own_liberties = empties[np.newaxis] * ndimage.binary_dilation(expanded_own_groups, surround_struct[np.newaxis])
-    all_opp_liberties = empties[np.newaxis] * ndimage.binary_dilation(expanded_opp_groups, surround_struct[np.newaxis])
-
-    # all_own_liberties和all_opp_liberties均是三维矩阵， np.sum( , axis=(1,2))针对每块棋子计算其气数
-    # own_liberty_counts和opp_liberty_counts均是一维数组，每个元素代表每块棋的气
-    own_liberty_counts = np.sum(all_own_liberties, axis=(1, 2))
-    opp_liberty_counts = np.sum(all_opp_liberties, axis=(1, 2))
-
-    # Possible invalids are on single liberties of opponent groups and on multi-liberties of own groups
-    # Definite valids are on single liberties of own groups, multi-liberties of opponent groups
-    # or you are not surrounded
-    possible_invalid_array += np.sum(all_own_liberties[own_liberty_counts > 1], axis=0)
-    possible_invalid_array += np.sum(all_opp_liberties[opp_liberty_counts == 1], axis=0)
-
-    definite_valids_array += np.sum(all_own_liberties[own_liberty_counts == 1], axis=0)
-    definite_valids_array += np.sum(all_opp_liberties[opp_liberty_counts > 1], axis=0)
-
-    # All invalid moves are occupied spaces + (possible invalids minus the definite valids and it's surrounded)
-    surrounded = ndimage.convolve(all_pieces, surround_struct, mode='constant', cval=1) == 4
-    invalid_moves = all_pieces + possible_invalid_array * (definite_valids_array == 0) * surrounded
-
-    # Ko-protection
-    if ko_protect is not None:
-        invalid_moves[ko_protect[0], ko_protect[1]] = 1
-    return invalid_moves > 0
-
-
-def batch_compute_invalid_moves(batch_state, batch_player, batch_ko_protect):
+def batch_compute_invalid_moves(batch_state, batch_player, batch_ko_protect, analysis=None):
     """
     Updates invalid moves in the OPPONENT's perspective
     1.) Opponent cannot move at a location
@@ -105,126 +437,58 @@ def batch_compute_invalid_moves(batch_state, batch_player, batch_ko_protect):
             not adjacent to other groups with more than one liberty and is completely surrounded
         ii.) If it's surrounded by our pieces and all of those corresponding groups
             move more than one liberty
+    :param batch_ko_protect: (BATCH_SIZE,) 1D index of the ko-protected point of each game, -1 for none
+    :param analysis: Optional BatchBoardAnalysis of batch_state, to reuse its groups and liberties
     """
-    batch_idcs = np.arange(len(batch_state))
-
-    # All pieces and empty spaces
-    batch_all_pieces = np.sum(batch_state[:, [govars.BLACK, govars.WHITE]], axis=1)
-    batch_empties = 1 - batch_all_pieces
-
-    # Setup invalid and valid arrays
-    batch_possible_invalid_array = np.zeros(batch_state.shape[:1] + batch_state.shape[2:])
-    batch_definite_valids_array = np.zeros(batch_state.shape[:1] + batch_state.shape[2:])
-
-    # Get all groups
-    batch_all_own_groups, _ = measurements.label(batch_state[batch_idcs, batch_player], group_struct)
-    batch_all_opp_groups, _ = measurements.label(batch_state[batch_idcs, 1 - batch_player], group_struct)
-
-    batch_data = enumerate(zip(batch_all_own_groups, batch_all_opp_groups, batch_empties))
-    for i, (all_own_groups, all_opp_groups, empties) in batch_data:
-        own_labels = np.unique(all_own_groups)
-        opp_labels = np.unique(all_opp_groups)
-        own_labels = own_labels[np.nonzero(own_labels)]
-        opp_labels = opp_labels[np.nonzero(opp_labels)]
-        expanded_own_groups = np.zeros((len(own_labels), *all_own_groups.shape))
-        expanded_opp_groups = np.zeros((len(opp_labels), *all_opp_groups.shape))
-
-        # Expand the groups such that each group is in its own channel
-        for j, label in enumerate(own_labels):
-            expanded_own_groups[j] = all_own_groups == label
-
-        for j, label in enumerate(opp_labels):
-            expanded_opp_groups[j] = all_opp_groups == label
-
-        # Get all liberties in the expanded form
-        all_own_liberties = empties[np.newaxis] * ndimage.binary_dilation(expanded_own_groups,
-                                                                          surround_struct[np.newaxis])
-        all_opp_liberties = empties[np.newaxis] * ndimage.binary_dilation(expanded_opp_groups,
-                                                                          surround_struct[np.newaxis])
-
-        own_liberty_counts = np.sum(all_own_liberties, axis=(1, 2))
-        opp_liberty_counts = np.sum(all_opp_liberties, axis=(1, 2))
-
-        # Possible invalids are on single liberties of opponent groups and on multi-liberties of own groups
-        # Definite valids are on single liberties of own groups, multi-liberties of opponent groups
-        # or you are not surrounded
-        batch_possible_invalid_array[i] += np.sum(all_own_liberties[own_liberty_counts > 1], axis=0)
-        batch_possible_invalid_array[i] += np.sum(all_opp_liberties[opp_liberty_counts == 1], axis=0)
-
-        batch_definite_valids_array[i] += np.sum(all_own_liberties[own_liberty_counts == 1], axis=0)
-        batch_definite_valids_array[i] += np.sum(all_opp_liberties[opp_liberty_counts > 1], axis=0)
-
-    # All invalid moves are occupied spaces + (possible invalids minus the definite valids and it's surrounded)
-    surrounded = ndimage.convolve(batch_all_pieces, surround_struct[np.newaxis], mode='constant', cval=1) == 4
-    invalid_moves = batch_all_pieces + batch_possible_invalid_array * (batch_definite_valids_array == 0) * surrounded
-
-    # Ko-protection
-    for i, ko_protect in enumerate(batch_ko_protect):
-        if ko_protect is not None:
-            invalid_moves[i, ko_protect[0], ko_protect[1]] = 1
-    return invalid_moves > 0
+    if analysis is None:
+        analysis = BatchBoardAnalysis(batch_state)
+    return analysis.invalid_moves(batch_player, batch_ko_protect)
 
 
-def update_pieces(state, adj_locs, player):
+def update_pieces(state, adj_locs, player, analysis=None):
+    """
+    Removes the opponent groups next to adj_locs that have no liberties left
+    :param analysis: Optional BoardAnalysis of state, updated along
+    :return: The locations of every killed group
+    """
     opponent = 1 - player
-    killed_groups = []
+    if analysis is None:
+        analysis = BoardAnalysis(state)
 
-    all_pieces = np.sum(state[[govars.BLACK, govars.WHITE]], axis=0)
-    empties = 1 - all_pieces
-
-    all_opp_groups, _ = ndimage.measurements.label(state[opponent])
-
-    # Go through opponent groups
-    all_adj_labels = all_opp_groups[adj_locs[:, 0], adj_locs[:, 1]]
-    all_adj_labels = np.unique(all_adj_labels)
-    for opp_group_idx in all_adj_labels[np.nonzero(all_adj_labels)]:
-        opp_group = all_opp_groups == opp_group_idx
-        liberties = empties * ndimage.binary_dilation(opp_group)
-        if np.sum(liberties) <= 0:
-            # Killed group
-            opp_group_locs = np.argwhere(opp_group)
-            state[opponent, opp_group_locs[:, 0], opp_group_locs[:, 1]] = 0
-            killed_groups.append(opp_group_locs)
+    killed_groups = []
+    # Copied, the analysis forgets the labels of the killed groups
+    opp_labels = analysis.labels[opponent, :-1].reshape(state.shape[1:]).copy()
+    for label in analysis.killed_groups(opponent, adj_locs[:, 0] * state.shape[1] + adj_locs[:, 1]):
+        # Killed group
+        opp_group_locs = np.argwhere(opp_labels == label)
+        state[opponent, opp_group_locs[:, 0], opp_group_locs[:, 1]] = 0
+        killed_groups.append(opp_group_locs)
 
     return killed_groups
 
 
-def batch_update_pieces(batch_non_pass, batch_state, batch_adj_locs, batch_player):
+def batch_update_pieces(batch_non_pass, batch_state, batch_adj_locs, batch_player, analysis=None):
+    """
+    Removes the opponent groups next to the moves of the non-pass games that have no liberties left
+    :param batch_adj_locs: (K, 4) 1D neighbors of each move, from batch_adj_data
+    :param analysis: Optional BatchBoardAnalysis of batch_state, updated along
+    :return: A (K, BOARD_SIZE, BOARD_SIZE) bool array of the killed pieces, and the (K,) number of killed groups
+    """
     batch_opponent = 1 - batch_player
-    batch_killed_groups = []
-
-    batch_all_pieces = np.sum(batch_state[:, [govars.BLACK, govars.WHITE]], axis=1)
-    batch_empties = 1 - batch_all_pieces
-
-    batch_all_opp_groups, _ = ndimage.measurements.label(batch_state[batch_non_pass, batch_opponent],
-                                                         group_struct)
-
-    batch_data = enumerate(zip(batch_all_opp_groups, batch_all_pieces, batch_empties, batch_adj_locs, batch_opponent))
-    for i, (all_opp_groups, all_pieces, empties, adj_locs, opponent) in batch_data:
-        killed_groups = []
-
-        # Go through opponent groups
-        all_adj_labels = all_opp_groups[adj_locs[:, 0], adj_locs[:, 1]]
-        all_adj_labels = np.unique(all_adj_labels)
-        for opp_group_idx in all_adj_labels[np.nonzero(all_adj_labels)]:
-            opp_group = all_opp_groups == opp_group_idx
-            liberties = empties * ndimage.binary_dilation(opp_group)
-            if np.sum(liberties) <= 0:
-                # Killed group
-                opp_group_locs = np.argwhere(opp_group)
-                batch_state[batch_non_pass[i], opponent, opp_group_locs[:, 0], opp_group_locs[:, 1]] = 0
-                killed_groups.append(opp_group_locs)
+    if analysis is None:
+        analysis = BatchBoardAnalysis(batch_state)
 
-        batch_killed_groups.append(killed_groups)
+    batch_killed, batch_num_killed = analysis.killed_groups(batch_non_pass, batch_opponent, batch_adj_locs)
+    batch_killed = batch_killed.reshape(-1, *batch_state.shape[2:])
+    batch_state[batch_non_pass, batch_opponent] *= ~batch_killed
 
-    return batch_killed_groups
+    return batch_killed, batch_num_killed
 
 
 def adj_data(state, action2d, player):
-    neighbors = neighbor_deltas + action2d
-    valid = (neighbors >= 0) & (neighbors < state.shape[1])
-    valid = np.prod(valid, axis=1)
-    neighbors = neighbors[np.nonzero(valid)]
+    geo = geometry(state.shape[1])
+    neighbors = geo.neighbors[geo.idcs[action2d[0], action2d[1]]]
+    neighbors = geo.coords[neighbors[neighbors != geo.pass_idx]]
 
     opp_pieces = state[1 - player]
     surrounded = (opp_pieces[neighbors[:, 0], neighbors[:, 1]] > 0).all()
@@ -233,11 +497,19 @@ def adj_data(state, action2d, player):
 
 
 def batch_adj_data(batch_state, batch_action2d, batch_player):
-    batch_neighbors, batch_surrounded = [], []
-    for state, action2d, player in zip(batch_state, batch_action2d, batch_player):
-        neighbors, surrounded = adj_data(state, action2d, player)
-        batch_neighbors.append(neighbors)
-        batch_surrounded.append(surrounded)
+    """
+    :return: The (BATCH_SIZE, 4) 1D neighbors of each move (off-board ones are the sentinel index),
+    and whether each move is surrounded by opponent's pieces
+    """
+    batch_idcs = np.arange(len(batch_state))
+    size = batch_state.shape[2]
+    batch_neighbors = neighbor_table(size)[batch_action2d[:, 0] * size + batch_action2d[:, 1]]
+
+    # Off-board neighbors do not prevent surrounding
+    batch_opp_pieces = batch_state[batch_idcs, 1 - batch_player].reshape(len(batch_state), size ** 2) > 0
+    batch_opp_pieces = np.append(batch_opp_pieces, np.ones((len(batch_state), 1), dtype=bool), axis=1)
+    batch_surrounded = batch_opp_pieces[batch_idcs[:, np.newaxis], batch_neighbors].all(axis=1)
+
     return batch_neighbors, batch_surrounded
 
 
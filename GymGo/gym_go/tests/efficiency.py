@@ -1,3 +1,4 @@
+import os
 import time
 import unittest
 
@@ -5,6 +6,8 @@ import gym
 import numpy as np
 from tqdm import tqdm
 
+from gym_go import gogame
+
 
 class Efficiency(unittest.TestCase):
     boardsize = 9
@@ -86,6 +89,122 @@ class Efficiency(unittest.TestCase):
         print(f"Rand Trajs w/ Children: {avg_time:.3f} AVG SEC, {std_time:.3f} STD SEC, {avg_steps:.1f} AVG STEPS",
               flush=True)
 
+    def testBackends(self):
+        backend = gogame.BACKEND
+        for boardsize in [9, 13, 19]:
+            for gogame.BACKEND in ['ndimage', 'bitboard']:
+                np.random.seed(0)
+                durs = []
+                num_steps = 0
+                for _ in tqdm(range(self.iterations // 8)):
+                    state = gogame.init_state(boardsize)
+                    start = time.time()
+                    for _ in range(boardsize ** 2):
+                        valid_moves = gogame.valid_moves(state)
+                        # Do not pass if possible
+                        if np.sum(valid_moves) > 1:
+                            valid_moves[-1] = 0
+                        state = gogame.next_state(state, np.random.choice(np.flatnonzero(valid_moves)))
+                        gogame.areas(state)
+                        num_steps += 1
+                    durs.append(time.time() - start)
+
+                print(f"{gogame.BACKEND} {boardsize}x{boardsize}: {np.sum(durs) / num_steps * 1e6:.1f} us per step "
+                      f"(next_state + areas)", flush=True)
+        gogame.BACKEND = backend
+
+    def testBatchNextStates(self):
+        batch_size = 256
+        for boardsize in [9, 19]:
+            np.random.seed(0)
+            states = []
+            for _ in range(batch_size):
+                state = gogame.init_state(boardsize)
+                for _ in range(boardsize ** 2 // 2):
+                    state = gogame.next_state(state, np.random.choice(np.flatnonzero(gogame.valid_moves(state)[:-1])))
+                states.append(state)
+            states = np.array(states)
+            actions = np.array([np.random.choice(np.flatnonzero(gogame.valid_moves(state))) for state in states])
+
+            start = time.time()
+            for state, action in zip(states, actions):
+                gogame.next_state(state, action)
+            single_dur = time.time() - start
+
+            start = time.time()
+            gogame.batch_next_states(states, actions)
+            batch_dur = time.time() - start
+
+            print(f"{boardsize}x{boardsize}, B={batch_size}: {single_dur * 1e3:.1f} ms single states, "
+                  f"{batch_dur * 1e3:.1f} ms batched", flush=True)
+
+    def testBatchAreas(self):
+        np.random.seed(0)
+        states = []
+        for _ in range(64):
+            state = gogame.init_state(self.boardsize)
+            while not gogame.game_ended(state):
+                valid_moves = gogame.valid_moves(state)
+                # Pass rarely, to play the games out
+                if np.sum(valid_moves) > 1 and np.random.rand() < 0.97:
+                    valid_moves[-1] = 0
+                state = gogame.next_state(state, np.random.choice(np.flatnonzero(valid_moves)))
+            states.append(state)
+        states = np.array(states * 64)
+
+        start = time.time()
+        for state in states:
+            gogame.areas(state)
+        single_dur = time.time() - start
+
+        start = time.time()
+        gogame.batch_areas(states)
+        batch_dur = time.time() - start
+
+        print(f"Areas of {len(states)} terminal positions: {single_dur * 1e3:.1f} ms single states, "
+              f"{batch_dur * 1e3:.1f} ms batched", flush=True)
+
+    def testVecEnv(self):
+        num_envs = 256
+        num_steps = 32
+        np.random.seed(0)
+        envs = [gym.make('gym_go:go-v0', size=self.boardsize) for _ in range(num_envs)]
+        start = time.time()
+        for env in envs:
+            env.reset()
+        for _ in range(num_steps):
+            for env in envs:
+                if env.step(env.uniform_random_action())[2]:
+                    env.reset()
+        loop_dur = time.time() - start
+
+        vec_env = gym.make('gym_go:vec-go-v0', num_envs=num_envs, size=self.boardsize)
+        start = time.time()
+        vec_env.reset()
+        for _ in range(num_steps):
+            vec_env.step(vec_env.uniform_random_action())
+        vec_dur = time.time() - start
+
+        print(f"{num_envs} envs x {num_steps} steps: {num_envs * num_steps / loop_dur:.0f} steps/s looped GoEnvs, "
+              f"{num_envs * num_steps / vec_dur:.0f} steps/s VecGoEnv", flush=True)
+
+    def testSubprocVecEnvScaling(self):
+        num_envs = 512
+        num_steps = 32
+        # Powers of two, then the full width of the machine
+        cpu_count = os.cpu_count()
+        worker_counts = [2 ** i for i in range(cpu_count.bit_length()) if 2 ** i < cpu_count] + [cpu_count]
+        for num_workers in worker_counts:
+            env = gym.make('gym_go:subproc-vec-go-v0', num_envs=num_envs, size=self.boardsize,
+                           num_workers=num_workers)
+            env.reset()
+            start = time.time()
+            for _ in range(num_steps):
+                env.step(env.uniform_random_action())
+            dur = time.time() - start
+            env.close()
+            print(f"{num_workers} workers, {num_envs} envs: {num_envs * num_steps / dur:.0f} steps/s", flush=True)
+
 
 if __name__ == '__main__':
     unittest.main()
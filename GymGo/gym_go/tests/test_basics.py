@@ -34,6 +34,45 @@ class TestGoEnvBasics(unittest.TestCase):
 
             env.close()
 
+    def test_compact_dtype(self):
+        for dtype in [np.uint8, np.bool_]:
+            env = gym.make('gym_go:go-v0', size=7, dtype=dtype)
+            expected_env = gym.make('gym_go:go-v0', size=7)
+            state, expected_state = env.reset(), expected_env.reset()
+            done = False
+            while not done:
+                action = expected_env.uniform_random_action()
+                state, reward, done, _ = env.step(action)
+                expected_state, expected_reward, _, _ = expected_env.step(action)
+                self.assertEqual(state.dtype, dtype)
+                self.assertTrue((state == expected_state).all())
+                self.assertEqual(reward, expected_reward)
+                if not done:
+                    self.assertEqual(env.children(canonical=True).dtype, dtype)
+
+    def test_readonly_views(self):
+        env = gym.make('gym_go:go-v0', size=7, readonly_views=True)
+        expected_env = gym.make('gym_go:go-v0', size=7)
+        env.reset()
+        expected_env.reset()
+        states = []
+        done = False
+        while not done:
+            action = expected_env.uniform_random_action()
+            state, reward, done, info = env.step(action)
+            expected_state, expected_reward, _, expected_info = expected_env.step(action)
+            self.assertFalse(state.flags.writeable or env.state().flags.writeable)
+            self.assertTrue((state == expected_state).all())
+            self.assertEqual(reward, expected_reward)
+            self.assertIsInstance(info, dict)
+            self.assertEqual(set(info), set(expected_info))
+            for key in expected_info:
+                self.assertTrue(np.all(info[key] == expected_info[key]))
+            states.append((state, expected_state))
+        # Later steps do not change the returned views
+        for state, expected_state in states:
+            self.assertTrue((state == expected_state).all())
+
     def test_empty_board(self):
         state = self.env.reset()
         self.assertEqual(np.count_nonzero(state), 0)
@@ -222,6 +261,18 @@ class TestGoEnvBasics(unittest.TestCase):
                 else:
                     self.assertTrue((children[a] == 0).all())
 
+    def test_iter_children(self):
+        for _ in range(20):
+            if self.env.step(self.env.uniform_random_action())[2]:
+                break
+        children = self.env.children(canonical=True, padded=False)
+        valid_move_idcs = np.flatnonzero(self.env.valid_moves())
+        for chunk_size in [1, 7, 64]:
+            chunks = list(self.env.iter_children(canonical=True, chunk_size=chunk_size))
+            self.assertTrue(all(len(actions) <= chunk_size for actions, _ in chunks))
+            self.assertTrue((np.concatenate([actions for actions, _ in chunks]) == valid_move_idcs).all())
+            self.assertTrue((np.concatenate([chunk for _, chunk in chunks]) == children).all())
+
     def test_real_reward(self):
         env = gym.make('gym_go:go-v0', size=7, reward_method='real')
 
@@ -1,5 +1,7 @@
 import unittest
 
+import numpy as np
+
 from gym_go import gogame, govars
 
 
@@ -33,6 +35,96 @@ class TestBatchFns(unittest.TestCase):
 
         self.assertTrue((canon_again == states).all())
 
+    def test_batch_next_states(self):
+        np.random.seed(0)
+        for size in [5, 7, 9]:
+            # Games of random lengths, so the batch mixes passes, captures and ko
+            states = []
+            for _ in range(32):
+                state = gogame.init_state(size)
+                for _ in range(np.random.randint(4 * size ** 2)):
+                    if gogame.game_ended(state):
+                        break
+                    state = gogame.next_state(state, gogame.random_action(state))
+                if not gogame.game_ended(state):
+                    states.append(state)
+            states = np.array(states)
+
+            actions = np.array([gogame.random_action(state) for state in states])
+            for canonical in [False, True]:
+                batch_next_states = gogame.batch_next_states(states, actions, canonical)
+                for state, action, next_state in zip(states, actions, batch_next_states):
+                    self.assertTrue((gogame.next_state(state, action, canonical) == next_state).all())
+
+        all_pass = gogame.batch_next_states(gogame.batch_init_state(2, 5), np.array([25, 25]))
+        self.assertTrue((all_pass[:, govars.PASS_CHNL] == 1).all())
+
+    def test_batch_areas(self):
+        np.random.seed(0)
+        states = []
+        for _ in range(16):
+            state = gogame.init_state(7)
+            for _ in range(np.random.randint(100)):
+                if gogame.game_ended(state):
+                    break
+                state = gogame.next_state(state, gogame.random_action(state))
+            states.append(state)
+
+        black_areas, white_areas = gogame.batch_areas(np.array(states))
+        for state, black_area, white_area in zip(states, black_areas, white_areas):
+            self.assertEqual(gogame.areas(state), (black_area, white_area))
+
+    def test_symmetries(self):
+        np.random.seed(0)
+        images = np.random.rand(4, 3, 5, 5)
+        policies = np.random.rand(4, 26)
+        symmetries = gogame.batch_symmetries(images)
+        policy_symmetries = gogame.batch_policy_symmetries(policies)
+        for image, policy, image_symmetries, policy_syms in zip(images, policies, symmetries, policy_symmetries):
+            for i in range(8):
+                expected = image
+                if (i >> 0) % 2:
+                    expected = np.flip(expected, 2)
+                if (i >> 1) % 2:
+                    expected = np.flip(expected, 1)
+                if (i >> 2) % 2:
+                    expected = np.rot90(expected, axes=(1, 2))
+                self.assertTrue((image_symmetries[i] == expected).all(), i)
+
+                # The policy of a position follows its stone, and the pass stays last
+                stone = np.zeros((1, 26))
+                stone[0, np.argmax(policy[:-1])] = 1
+                oriented_stone = gogame.batch_policy_symmetries(stone)[0, i]
+                oriented_image = gogame.batch_symmetries(stone[:, np.newaxis, :-1].reshape(1, 1, 5, 5))[0, i]
+                self.assertTrue((oriented_stone[:-1] == oriented_image.flatten()).all())
+                self.assertEqual(policy_syms[i, -1], policy[-1])
+
+        orientations = np.random.randint(8, size=len(images))
+        oriented = gogame.batch_symmetry(images, orientations)
+        self.assertTrue((oriented == symmetries[np.arange(len(images)), orientations]).all())
+        self.assertTrue((gogame.batch_symmetry(oriented, orientations, inverse=True) == images).all())
+        oriented = gogame.batch_policy_symmetry(policies, orientations)
+        self.assertTrue((oriented == policy_symmetries[np.arange(len(images)), orientations]).all())
+        self.assertTrue((gogame.batch_policy_symmetry(oriented, orientations, inverse=True) == policies).all())
+
+    def test_policy_symmetries_follow_states(self):
+        # Same augmentation as Trainer.get_equi_data: the policy of every orientation must still mark
+        # the points of the oriented state, also for the 90 and 270 degree rotations
+        np.random.seed(0)
+        states, policies = [], []
+        state = gogame.init_state(7)
+        for _ in range(10):
+            state = gogame.next_state(state, gogame.random_action(state))
+            policy = np.append(state[govars.BLACK].flatten(), 1)
+            states.append(state)
+            policies.append(policy / policy.sum())
+        symmetries = gogame.batch_symmetries(np.array(states))
+        policy_symmetries = gogame.batch_policy_symmetries(np.array(policies))
+        for state_symmetries, policy_syms in zip(symmetries, policy_symmetries):
+            for i in range(8):
+                marked = policy_syms[i, :-1].reshape(7, 7) > 0
+                self.assertTrue((marked == (state_symmetries[i, govars.BLACK] > 0)).all(), i)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+import numpy as np
+
+from gym_go import bitboard, gogame
+
+
+class TestBitboard(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def setUp(self):
+        np.random.seed(0)
+
+    def test_matches_ndimage(self):
+        for size in [3, 7, 9, 13]:
+            for _ in range(4):
+                state = gogame.init_state(size)
+                for _ in range(2 * size ** 2):
+                    if gogame.game_ended(state):
+                        break
+                    action = gogame.random_action(state)
+                    for canonical in [False, True]:
+                        expected = ndimage(gogame.next_state, state, action, canonical)
+                        child = bitboard.next_state(state, action, canonical)
+                        self.assertTrue((expected == child).all(), (size, action, canonical))
+                    state = gogame.next_state(state, action)
+                    self.assertEqual(bitboard.areas(state), ndimage(gogame.areas, state))
+                    self.assertTrue((bitboard.valid_moves(state) == gogame.valid_moves(state)).all())
+                    self.assertEqual(bitboard.game_ended(state), gogame.game_ended(state))
+
+
+def ndimage(fn, *args):
+    """
+    Runs a gogame function on the ndimage backend, whatever GYM_GO_BACKEND is set to
+    """
+    backend, gogame.BACKEND = gogame.BACKEND, 'ndimage'
+    try:
+        return fn(*args)
+    finally:
+        gogame.BACKEND = backend
+
+
+if __name__ == '__main__':
+    unittest.main()
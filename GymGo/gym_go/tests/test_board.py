@@ -0,0 +1,202 @@
+import unittest
+
+import gym
+import numpy as np
+
+from gym_go import bitboard, gogame, govars, state_utils, zobrist
+from gym_go.board import Board
+
+
+class TestBoard(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def setUp(self):
+        np.random.seed(0)
+
+    def test_matches_full_recomputation(self):
+        for size in [3, 5, 7, 9]:
+            for _ in range(10):
+                state = gogame.init_state(size)
+                board = Board(size)
+                for _ in range(3 * size ** 2):
+                    if gogame.game_ended(state):
+                        break
+                    valid_moves = gogame.valid_moves(state)
+                    # Do not pass if possible
+                    if np.sum(valid_moves) > 1:
+                        valid_moves[-1] = 0
+                    action = np.random.choice(np.flatnonzero(valid_moves))
+
+                    expected = gogame.next_state(state, action)
+                    state = gogame.next_state(state, action, board=board)
+                    self.assertTrue((expected == state).all(), (size, action))
+
+    def test_geometry(self):
+        for size in [1, 5, 9]:
+            geo = state_utils.geometry(size)
+            self.assertIs(geo, state_utils.geometry(size))
+            for idx, (row, col) in enumerate(geo.coords):
+                self.assertEqual(geo.idcs[row, col], idx)
+                for table, deltas in [(geo.neighbors, state_utils.neighbor_deltas),
+                                      (geo.diagonals, state_utils.diagonal_deltas)]:
+                    for point, (d_row, d_col) in zip(table[idx], deltas):
+                        if 0 <= row + d_row < size and 0 <= col + d_col < size:
+                            self.assertEqual(point, (row + d_row) * size + col + d_col)
+                        else:
+                            self.assertEqual(point, size ** 2)
+                            self.assertTrue(geo.on_side[row, col])
+
+    def test_liberties(self):
+        board = Board(7)
+        state = gogame.init_state(7)
+        for action in [0, 1, 7]:
+            state = gogame.next_state(state, action, board=board)
+
+        black_group = board.group[0]
+        self.assertEqual(board.group[7], black_group)
+        self.assertEqual(board.libs[black_group], {14, 8})
+        self.assertEqual(board.lib_counts[black_group], 2)
+        self.assertEqual(board.lib_counts[board.group[1]], 2)
+
+        # Capture the white stone
+        for action in [48, 8, 47, 2]:
+            state = gogame.next_state(state, action, board=board)
+        self.assertEqual(state[govars.WHITE].sum(), 2)
+        self.assertEqual(state[govars.WHITE, 0, 1], 0)
+        self.assertEqual(board.group[8], black_group)
+        self.assertEqual(board.libs[black_group], {1, 9, 14, 15})
+        self.assertEqual(board.lib_counts[board.group[2]], 3)
+
+    def test_from_state(self):
+        state = gogame.init_state(7)
+        board = Board(7)
+        for _ in range(30):
+            action = gogame.random_action(state)
+            state = gogame.next_state(state, action, board=board)
+
+        rebuilt = Board.from_state(state, board.ko)
+        self.assertEqual(rebuilt.turn, board.turn)
+        self.assertTrue((rebuilt.color == board.color).all())
+        self.assertTrue((rebuilt.lib_counts[rebuilt.group] == board.lib_counts[board.group]).all())
+        self.assertTrue((rebuilt.invalid_moves() == state[govars.INVD_CHNL]).all())
+
+    def test_analysis(self):
+        state = gogame.init_state(7)
+        board = Board(7)
+        for _ in range(40):
+            state = gogame.next_state(state, gogame.random_action(state), board=board)
+            analysis = state_utils.BoardAnalysis(state)
+            for color in [govars.BLACK, govars.WHITE]:
+                stones = np.flatnonzero(state[color])
+                liberty_counts = analysis.liberty_counts[color][analysis.labels[color, stones]]
+                self.assertTrue((liberty_counts == board.lib_counts[board.group[stones]]).all())
+            self.assertEqual(analysis.areas(), bitboard.areas(state))
+
+    def test_eyes(self):
+        for size in [3, 5, 7]:
+            for _ in range(5):
+                board = Board(size)
+                state = gogame.init_state(size)
+                for _ in range(3 * size ** 2):
+                    if gogame.game_ended(state):
+                        break
+                    valid_moves = gogame.valid_moves(state)
+                    # Pass rarely, to fill the board
+                    if np.sum(valid_moves) > 1 and np.random.rand() < 0.95:
+                        valid_moves[-1] = 0
+                    action = np.random.choice(np.flatnonzero(valid_moves))
+                    board.play(action, record=True)
+                    board.undo()
+                    state = gogame.next_state(state, action, board=board)
+
+                    analysis = state_utils.BoardAnalysis(state, label_groups=False)
+                    for player in [govars.BLACK, govars.WHITE]:
+                        expected = analysis.eyes(player).flatten()
+                        self.assertTrue((board.eyes[player, :-1] == expected).all(), (size, action))
+                        from_state = Board.from_state(state)
+                        self.assertTrue((from_state.eyes[player, :-1] == expected).all())
+
+    def test_next_position_hashes(self):
+        board = Board(5)
+        state = gogame.init_state(5)
+        for _ in range(60):
+            if gogame.game_ended(state):
+                break
+            candidates = np.flatnonzero(1 - board.invalid_moves())
+            next_hashes = board.next_position_hashes(candidates)
+            for action, next_hash in zip(candidates, next_hashes):
+                child = board.copy()
+                child.play(action)
+                self.assertEqual(child.position_hash(), next_hash, action)
+            state = gogame.next_state(state, gogame.random_action(state), board=board)
+
+    def test_superko(self):
+        for _ in range(5):
+            env = gym.make('gym_go:go-v0', size=4, superko=True)
+            state = env.reset()
+            positions = {state[[govars.BLACK, govars.WHITE]].tobytes()}
+            done = False
+            while not done:
+                action = env.uniform_random_action()
+                state, _, done, _ = env.step(action)
+                position = state[[govars.BLACK, govars.WHITE]].tobytes()
+                if action != env.size ** 2:
+                    self.assertNotIn(position, positions)
+                positions.add(position)
+
+    def test_undo(self):
+        for superko in [False, True]:
+            board = Board(5, superko)
+            state = gogame.init_state(5)
+            for _ in range(60):
+                if gogame.game_ended(state):
+                    break
+                invalid_moves = board.invalid_moves()
+                for action in np.append(np.flatnonzero(~invalid_moves), 25).tolist():
+                    board.play(action, record=True)
+                    board.undo()
+                    self.assertEqual(board.hash, zobrist.hash_state(state, board.ko))
+                    self.assertTrue((board.invalid_moves() == invalid_moves).all(), action)
+                    expected = Board.from_state(state, board.ko)
+                    self.assertTrue((board.color == expected.color).all())
+                    self.assertTrue((board.lib_counts[board.group] == expected.lib_counts[expected.group]).all())
+                state = gogame.next_state(state, gogame.random_action(state), board=board)
+
+    def test_copy(self):
+        board = Board(5, superko=True)
+        state = gogame.init_state(5)
+        for _ in range(10):
+            state = gogame.next_state(state, gogame.random_action(state), board=board)
+        history = set(board.history)
+        copies = [board.copy() for _ in range(2)]
+        for copy in copies[:1] + [board]:
+            action = np.flatnonzero(~copy.invalid_moves())[0]
+            copy.play(action, record=True)
+            copy.undo()
+            copy.play(action)
+        self.assertEqual(copies[1].history, history)
+        self.assertEqual(len(copies[0].history), len(history) + 1)
+        self.assertEqual(copies[0].history, board.history)
+
+    def test_pass_alive(self):
+        state = gogame.init_state(5)
+        state[govars.BLACK, :, [1, 3]] = 1
+        alive, territory = gogame.pass_alive(state)
+        self.assertTrue((alive[govars.BLACK] == state[govars.BLACK]).all())
+        self.assertFalse(alive[govars.WHITE].any() or territory[govars.WHITE].any())
+        self.assertEqual(gogame.settled_areas(state), (25, 0))
+
+        # A white stone inside black's territory is dead
+        state[govars.WHITE, 2, 4] = 1
+        self.assertEqual(gogame.settled_areas(state), (25, 0))
+
+        # Black's territory is not settled once white could live in it
+        state = gogame.init_state(5)
+        state[govars.BLACK, :, 1] = 1
+        self.assertIsNone(gogame.settled_areas(state))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+import gym
+import numpy as np
+
+from gym_go import gogame, govars
+
+
+class TestVecGoEnv(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def setUp(self):
+        np.random.seed(0)
+
+    def test_matches_single_envs(self):
+        num_envs = 8
+        for reward_method in ['real', 'heuristic']:
+            vec_env = gym.make('gym_go:vec-go-v0', num_envs=num_envs, size=5, komi=0.5, reward_method=reward_method)
+            envs = [gym.make('gym_go:go-v0', size=5, komi=0.5, reward_method=reward_method) for _ in range(num_envs)]
+            states = vec_env.reset()
+            for env in envs:
+                env.reset()
+            num_dones = 0
+            for _ in range(100):
+                valid_moves = vec_env.valid_moves()
+                for env, valid in zip(envs, valid_moves):
+                    self.assertTrue((valid == env.valid_moves()).all())
+                actions = vec_env.uniform_random_action()
+                self.assertTrue(valid_moves[np.arange(num_envs), actions].all())
+
+                states, rewards, dones, info = vec_env.step(actions)
+                final_states = iter(info['final_states'])
+                for i, env in enumerate(envs):
+                    state, reward, done, _ = env.step(actions[i])
+                    self.assertEqual(done, dones[i])
+                    self.assertEqual(reward, rewards[i])
+                    if done:
+                        self.assertTrue((next(final_states) == state).all())
+                        state = env.reset()
+                    self.assertTrue((states[i] == state).all())
+                    self.assertEqual(info['turn'][i], gogame.turn(state))
+                self.assertTrue((info['valid_moves'] == vec_env.valid_moves()).all())
+                num_dones += np.sum(dones)
+            self.assertGreater(num_dones, 0)
+
+    def test_subproc_matches_vec_env(self):
+        for dtype in [np.float64, np.uint8]:
+            subproc_env = gym.make('gym_go:subproc-vec-go-v0', num_envs=10, size=5, num_workers=3,
+                                   reward_method='heuristic', dtype=dtype)
+            vec_env = gym.make('gym_go:vec-go-v0', num_envs=10, size=5, reward_method='heuristic', dtype=dtype)
+            self.assertTrue((subproc_env.reset() == vec_env.reset()).all())
+            for _ in range(100):
+                actions = vec_env.uniform_random_action()
+                states, rewards, dones, info = subproc_env.step(actions)
+                expected_states, expected_rewards, expected_dones, expected_info = vec_env.step(actions)
+                self.assertEqual(states.dtype, dtype)
+                self.assertTrue((states == expected_states).all())
+                self.assertTrue((rewards == expected_rewards).all())
+                self.assertTrue((dones == expected_dones).all())
+                for key in expected_info:
+                    self.assertTrue((info[key] == expected_info[key]).all(), key)
+            subproc_env.close()
+
+    def test_reset(self):
+        vec_env = gym.make('gym_go:vec-go-v0', num_envs=4, size=7)
+        vec_env.reset()
+        states, _, _, _ = vec_env.step(np.arange(4))
+        self.assertEqual(np.count_nonzero(states[:, govars.BLACK]), 4)
+        states = vec_env.reset()
+        self.assertEqual(states.shape, (4, govars.NUM_CHNLS, 7, 7))
+        self.assertEqual(np.count_nonzero(states), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
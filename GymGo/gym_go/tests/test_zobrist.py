@@ -0,0 +1,66 @@
+import unittest
+
+import numpy as np
+
+from gym_go import gogame, govars, zobrist
+from gym_go.board import Board
+
+
+class TestZobrist(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def setUp(self):
+        np.random.seed(0)
+
+    def test_incremental_matches_full(self):
+        for size in [3, 7, 9]:
+            batch_states = gogame.batch_init_state(8, size)
+            batch_hashes = zobrist.batch_hash_states(batch_states)
+            batch_kos = -np.ones(8, dtype=np.int64)
+            boards = [Board(size) for _ in range(8)]
+            for _ in range(2 * size ** 2):
+                if gogame.batch_game_ended(batch_states).any():
+                    break
+                batch_action1d = np.array([gogame.random_action(state) for state in batch_states])
+                for state, board, action in zip(batch_states, boards, batch_action1d):
+                    gogame.next_state(state, action, board=board)
+                batch_states = gogame.batch_next_states(batch_states, batch_action1d, batch_hashes=batch_hashes,
+                                                        batch_kos=batch_kos)
+
+                self.assertTrue((batch_hashes == zobrist.batch_hash_states(batch_states, batch_kos)).all())
+                self.assertEqual(list(batch_hashes), [board.hash for board in boards])
+                self.assertEqual(list(batch_kos), [-1 if board.ko is None else board.ko for board in boards])
+
+    def test_transposition(self):
+        hashes = []
+        for actions in [[0, 10, 20, 30], [20, 30, 0, 10], [20, 10, 0, 30]]:
+            state = gogame.init_state(7)
+            board = Board(7)
+            for action in actions:
+                state = gogame.next_state(state, action, board=board)
+            hashes.append(board.hash)
+            self.assertEqual(board.hash, zobrist.hash_state(state))
+
+        self.assertEqual(hashes[0], hashes[1])
+        self.assertEqual(hashes[0], hashes[2])
+
+        # Same pieces, other turn
+        state = gogame.next_state(state, 49, board=board)
+        self.assertNotEqual(board.hash, hashes[0])
+
+    def test_ko(self):
+        state = gogame.init_state(7)
+        board = Board(7)
+        for move in [(0, 1), (0, 2), (1, 0), (1, 3), (2, 1), (2, 2), (1, 2), (1, 1)]:
+            state = gogame.next_state(state, move[0] * 7 + move[1], board=board)
+
+        self.assertEqual(board.ko, 1 * 7 + 2)
+        self.assertEqual(state[govars.INVD_CHNL, 1, 2], 1)
+        self.assertEqual(board.hash, zobrist.hash_state(state, board.ko))
+        self.assertNotEqual(board.hash, zobrist.hash_state(state))
+
+
+if __name__ == '__main__':
+    unittest.main()
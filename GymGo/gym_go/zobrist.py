@@ -0,0 +1,71 @@
+from functools import lru_cache
+
+import numpy as np
+
+from GymGo.gym_go import govars
+
+"""
+64-bit Zobrist hashing of positions
+
+The hash of a position is the XOR of
+* a key per piece (colour, 1D index)
+* the turn key, if it's white's turn
+* a key for the ko-protected point, if there is one
+
+Keys are drawn from a fixed seed, so hashes are the same across processes and runs.
+Ko points are 1D indices, and -1 means no ko-protection (its key is 0).
+"""
+
+SEED = 0x5EED
+
+
+class ZobristKeys:
+    def __init__(self, size):
+        rng = np.random.RandomState(SEED + size)
+        high = np.iinfo(np.uint64).max
+        self.size = size
+        self.pieces = rng.randint(1, high, size=(2, size ** 2), dtype=np.uint64)
+        self.turn = rng.randint(1, high, dtype=np.uint64)
+        # The last entry is the key of no ko-protection
+        self.ko = np.append(rng.randint(1, high, size=size ** 2, dtype=np.uint64), np.uint64(0))
+
+        for keys in [self.pieces, self.ko]:
+            keys.flags.writeable = False
+
+
+@lru_cache(maxsize=None)
+def get_keys(size):
+    return ZobristKeys(size)
+
+
+def hash_state(state, ko=None):
+    """
+    Computes the hash from scratch
+    :param state:
+    :param ko: 1D index of the ko-protected point, or None
+    :return: A np.uint64
+    """
+    keys = get_keys(state.shape[1])
+    pieces = state[[govars.BLACK, govars.WHITE]].reshape(2, -1) > 0
+    state_hash = np.bitwise_xor.reduce(keys.pieces[pieces])
+    if np.max(state[govars.TURN_CHNL]) == govars.WHITE:
+        state_hash ^= keys.turn
+    return state_hash ^ keys.ko[-1 if ko is None else ko]
+
+
+def batch_hash_states(batch_state, batch_ko=None):
+    """
+    Computes the hashes from scratch
+    :param batch_state:
+    :param batch_ko: 1D indices of the ko-protected points (-1 for none), or None
+    :return: A (BATCH_SIZE,) uint64 array
+    """
+    n = len(batch_state)
+    keys = get_keys(batch_state.shape[2])
+    pieces = batch_state[:, [govars.BLACK, govars.WHITE]].reshape(n, 2, -1) > 0
+    batch_hash = np.bitwise_xor.reduce(np.where(pieces, keys.pieces, np.uint64(0)), axis=(1, 2))
+    batch_hash ^= np.where(np.max(batch_state[:, govars.TURN_CHNL], axis=(1, 2)) == govars.WHITE,
+                           keys.turn, np.uint64(0))
+    if batch_ko is not None:
+        batch_hash ^= keys.ko[batch_ko]
+    return batch_hash
@@ -17,7 +17,6 @@ from pgutils.position import pos_in_surface
 from player import *
 import os
 from typing import List, Tuple, Callable, Union
-from trainer import Trainer
 
 SCREEN_SIZE = 1.8  # 控制模拟器界面放大或缩小的比例
 SCREENWIDTH = int(SCREEN_SIZE * 600)  # 屏幕宽度
@@ -56,8 +55,31 @@ SOUNDS = {
     'stone': pygame.mixer.Sound('assets/audios/Stone.wav'),
     'button': pygame.mixer.Sound('assets/audios/Button.wav')
 }
-MUSICS = [[os.path.splitext(music)[0], pygame.mixer.Sound('assets/musics/' + music)]
-          for music in os.listdir('assets/musics')]
+# [音乐名, 音乐文件路径]，音乐在首次播放时才解码，见music_sound
+MUSICS = [[os.path.splitext(music)[0], 'assets/musics/' + music] for music in os.listdir('assets/musics')]
+MUSIC_SOUNDS = {}
+# 当前播放的音乐，停止时只停止它，无需为此加载音乐
+playing_music = None
+
+
+def music_sound(music_id: int) -> pygame.mixer.Sound:
+    """第music_id首音乐，首次使用时解码并缓存"""
+    if music_id not in MUSIC_SOUNDS:
+        MUSIC_SOUNDS[music_id] = pygame.mixer.Sound(MUSICS[music_id][1])
+    return MUSIC_SOUNDS[music_id]
+
+
+def play_music(music_id: int):
+    """播放第music_id首音乐，并记为当前播放的音乐"""
+    global playing_music
+    playing_music = music_sound(music_id)
+    playing_music.play()
+
+
+def stop_music():
+    """停止当前播放的音乐"""
+    if playing_music is not None:
+        playing_music.stop()
 
 
 class GameEngine:
@@ -65,7 +87,8 @@ class GameEngine:
                  komi=7.5,
                  record_step: int = 4,
                  state_format: str = "separated",
-                 record_last: bool = True):
+                 record_last: bool = True,
+                 state_dtype=np.uint8):
         """
         游戏引擎初始化
 
@@ -76,6 +99,7 @@ class GameEngine:
                             【separated：黑白棋子分别记录在不同的矩阵中，[黑棋，白棋，下一步落子方，上一步落子位置(可选)]】
                             【merged：黑白棋子记录在同一个矩阵中，[棋盘棋子分布(黑1白-1)，下一步落子方，上一步落子位置(可选)]】
         :param record_last: 是否记录上一步落子位置
+        :param state_dtype: 棋盘状态的数据类型，默认使用紧凑的np.uint8，减小模拟对局及训练数据的内存占用
         """
         assert board_size in [9, 13, 19]
         assert state_format in ["separated", "merged"]
@@ -85,12 +109,13 @@ class GameEngine:
         self.record_step = record_step
         self.state_format = state_format
         self.record_last = record_last
+        self.state_dtype = state_dtype
 
         # 初始化GoEngine
         self.game_state = GoEngine(board_size=board_size, komi=komi, record_step=record_step,
-                                   state_format=state_format, record_last=record_last)
-        # 初始化训练器
-        self.trainer = Trainer()
+                                   state_format=state_format, record_last=record_last, state_dtype=state_dtype)
+        # 训练器在首次开始训练时才创建，避免启动时导入paddle
+        self.trainer = None
         self.train_game_state = None
 
         # 初始化pygame控件及工具管理器
@@ -193,7 +218,7 @@ class GameEngine:
 
         # 音乐播放
         if not pygame.mixer.get_busy():
-            MUSICS[self.music_id][1].play()
+            play_music(self.music_id)
 
         # 刷新屏幕
         pygame.display.update()
@@ -412,23 +437,9 @@ class GameEngine:
         self.manager.control_update(event)
 
     def game_state_simulator(self, train=False) -> GoEngine:
-        """返回一个用作模拟的game_state"""
-        game_state = GoEngine(board_size=self.board_size, komi=self.komi, record_step=self.record_step,
-                              state_format=self.state_format, record_last=self.record_last)
-
-        if not train:
-            game_state.current_state = np.copy(self.game_state.current_state)
-            game_state.board_state = np.copy(self.game_state.board_state)
-            game_state.board_state_history = copy.copy(self.game_state.board_state_history)
-            game_state.action_history = copy.copy(self.game_state.action_history)
-            game_state.done = self.game_state.done
-        else:
-            game_state.current_state = np.copy(self.train_game_state.current_state)
-            game_state.board_state = np.copy(self.train_game_state.board_state)
-            game_state.board_state_history = copy.copy(self.train_game_state.board_state_history)
-            game_state.action_history = copy.copy(self.train_game_state.action_history)
-            game_state.done = self.train_game_state.done
-        return game_state
+        """返回一个用作模拟的game_state，与源游戏状态写时复制地共用历史，见GoEngine.fork"""
+        source = self.train_game_state if train else self.game_state
+        return source.fork()
 
     def mouse_pos_to_action(self, mouse_pos):
         """将鼠标位置转换为action"""
@@ -531,17 +542,17 @@ class GameEngine:
                     while rand_int == self.music_id:
                         rand_int = np.random.randint(len(MUSICS))
                 self.music_id = rand_int
-                MUSICS[self.music_id][1].play()
+                play_music(self.music_id)
             elif self.music_control_id == 1:  # 顺序播放
                 self.music_id += 1
                 self.music_id %= len(MUSICS)
-                MUSICS[self.music_id][1].play()
+                play_music(self.music_id)
             elif self.music_control_id == 2:  # 单曲循环
-                MUSICS[self.music_id][1].play()
+                play_music(self.music_id)
             self.pmc_buttons[2].set_text(MUSICS[self.music_id][0])
             self.pmc_buttons[2].draw_up()
         elif pygame.mixer.get_busy() and self.music_control_id == 3:  # 音乐关
-            MUSICS[self.music_id][1].stop()
+            stop_music()
 
     def next_player(self):
         """返回下一步落子方玩家对象"""
@@ -597,7 +608,7 @@ class GameEngine:
         elif player_id == 1:
             player = RandomPlayer()
         elif player_id in [2, 3, 4, 5, 6]:
-            player = MCTSPlayer(n_playout=400 * (2 ** (player_id - 2)))
+            player = MCTSPlayer(n_playout=400 * (2 ** (player_id - 2)), adjudicate=True)
         elif player_id == 7:
             player = PolicyNetPlayer(model_path='models/alpha_go.pdparams')
         elif player_id == 8:
@@ -611,7 +622,7 @@ class GameEngine:
         return player
 
     def fct_for_music_choose(self):
-        MUSICS[self.music_id][1].stop()
+        stop_music()
         if self.music_control_id == 0:  # 随机播放
             rand_int = np.random.randint(len(MUSICS))  # 随机获取一首歌
             if len(MUSICS) > 1:
@@ -622,7 +633,7 @@ class GameEngine:
             self.music_id += 1
             self.music_id %= len(MUSICS)
         self.pmc_buttons[2].set_text(MUSICS[self.music_id][0])
-        MUSICS[self.music_id][1].play()
+        play_music(self.music_id)
 
     def fct_for_music_control(self):
         self.music_control_id += 1
@@ -631,7 +642,7 @@ class GameEngine:
         # 说明音乐控制按钮上一次为音乐关
         if self.music_control_id == 0:
             # 须直接将音乐打开
-            MUSICS[self.music_id][1].play()
+            play_music(self.music_id)
 
     def fct_for_play_game(self):
         # 当开始游戏按钮被点击
@@ -669,17 +680,15 @@ class GameEngine:
         if self.play_state:
             next_player = self.next_player()
             if isinstance(next_player, HumanPlayer):
-                if len(self.game_state.board_state_history) > 2:
-                    self.game_state.current_state = self.game_state.board_state_history[-3]
-                    self.game_state.board_state_history = self.game_state.board_state_history[:-2]
-                    action = self.game_state.action_history[-3]
-                    self.game_state.action_history = self.game_state.action_history[:-2]
+                if len(self.game_state.action_history) > 2:
+                    self.game_state.regret()
+                    action = self.game_state.action_history[-1]
                     self.draw_board()
                     self.draw_pieces()
                     self.draw_mark(action)
                     self.draw_taiji()
-                elif len(self.game_state.board_state_history) == 2:
-                    self.game_state.reset()
+                elif len(self.game_state.action_history) == 2:
+                    self.game_state.regret()
                     self.draw_board()
                     self.draw_taiji()
 
@@ -738,7 +747,8 @@ class GameEngine:
 
         # 初始化train_game_state
         self.train_game_state = GoEngine(board_size=self.board_size, komi=self.komi, record_step=self.record_step,
-                                         state_format=self.state_format, record_last=self.record_last)
+                                         state_format=self.state_format, record_last=self.record_last,
+                                         state_dtype=self.state_dtype)
         self.draw_board()
 
         self.pmc_buttons[0].set_text('训练状态')
@@ -761,6 +771,9 @@ class GameEngine:
         # 当开始训练按钮被点击
         if not self.train_state:
             self.train_state = True
+            if self.trainer is None:
+                from trainer import Trainer
+                self.trainer = Trainer()
             # 开启训练线程
             self.trainer.start(self)
 
@@ -4,22 +4,11 @@
 # @File    : go_engine.py
 # @Software: PyCharm
 
-from GymGo.gym_go import govars, gogame
+from GymGo.gym_go import govars, gogame, state_utils
+from GymGo.gym_go.board import Board, EMPTY
 from typing import Union, List, Tuple
 import numpy as np
-from scipy import ndimage
 
-surround_struct = np.array([[0, 1, 0],
-                            [1, 0, 1],
-                            [0, 1, 0]])
-
-eye_struct = np.array([[1, 1, 1],
-                       [1, 0, 1],
-                       [1, 1, 1]])
-
-corner_struct = np.array([[1, 0, 1],
-                          [0, 0, 0],
-                          [1, 0, 1]])
 BLACK = govars.BLACK
 WHITE = govars.WHITE
 
@@ -29,7 +18,12 @@ class GoEngine:
                  komi=7.5,
                  record_step: int = 4,
                  state_format: str = "separated",
-                 record_last: bool = True):
+                 record_last: bool = True,
+                 superko: bool = False,
+                 state_dtype=np.float64,
+                 adjudicate: bool = False,
+                 readonly_views: bool = False,
+                 snapshot_interval: int = 32):
         """
         围棋引擎初始化
 
@@ -40,6 +34,16 @@ class GoEngine:
                             【separated：黑白棋子分别记录在不同的矩阵中，[黑棋，白棋，下一步落子方，上一步落子位置(可选)]】
                             【merged：黑白棋子记录在同一个矩阵中，[棋盘棋子分布(黑1白-1)，下一步落子方，上一步落子位置(可选)]】
         :param record_last: 是否记录上一步落子位置
+        :param superko: 是否启用全局同形禁止（positional superko），启用后会重复本局已出现局面的落子无效
+        :param state_dtype: 棋盘状态及历史状态的数据类型，可取np.uint8或np.bool_以节省内存，
+                            merged格式下board_state含-1，此时使用np.int8；送入神经网络时才转换为float32
+        :param adjudicate: 是否在棋盘所有位置的归属均已确定时提前结束对局（Benson无条件活棋及其围住的地域，
+                           见gogame.pass_alive），并按确定的归属计算胜负，死子归对方
+        :param readonly_views: step、reset、get_board_state是否返回只读视图而非副本。
+                               每次step都会生成新的current_state，step返回的视图保持不变（push与pop之间除外）；
+                               board_state则原地更新，get_board_state返回的视图会随后续落子变化
+        :param snapshot_interval: 每隔多少步保存一次局面快照。历史只记录动作及这些快照，悔棋或获取历史局面时
+                                  从最近的快照重放动作，而非每步都保存一份完整局面
         """
         assert state_format in ["separated", "merged"],\
             "state_format can only be 'separated' or 'merged', but received: {}".format(state_format)
@@ -49,26 +53,62 @@ class GoEngine:
         self.record_step = record_step
         self.state_format = state_format
         self.record_last = record_last
-        self.current_state = gogame.init_state(board_size)
-        # 保存棋盘状态，用于悔棋
-        self.board_state_history = []
+        self.superko = superko
+        self.state_dtype = state_dtype
+        self.adjudicate = adjudicate
+        self.readonly_views = readonly_views
+        self.snapshot_interval = snapshot_interval
+        # merged格式的board_state中白棋为-1，无符号类型及bool改用np.int8
+        if state_format == "merged" and np.dtype(state_dtype).kind in 'bu':
+            self.board_state_dtype = np.int8
+        else:
+            self.board_state_dtype = state_dtype
+        self.current_state = gogame.init_state(board_size, state_dtype)
+        # 增量维护棋子块及其气，使落子只需处理落子位置邻域；启用superko时还记录本局出现过的局面哈希
+        self.board = Board(board_size, superko)
         # 保存历史动作，用于悔棋
         self.action_history = []
 
         if state_format == "separated":
             record_step *= 2
         self.state_channels = record_step + 2 if record_last else record_step + 1
-        self.board_state = np.zeros((self.state_channels, board_size, board_size))
+        # 历史特征平面的环形缓冲区：separated格式下黑白棋各一个环，merged格式下一个环，
+        # 每步只写入一个平面并前移该环的下标（指向最早的平面），神经网络输入在需要时才拼装
+        num_rings = 2 if state_format == "separated" else 1
+        self.history_planes = np.zeros((num_rings, self.record_step, board_size, board_size),
+                                       dtype=self.board_state_dtype)
+        self.history_heads = [0] * num_rings
+        # 拼装神经网络输入的复用缓冲区，落子、撤销后失效
+        self._board_state = np.zeros((self.state_channels, board_size, board_size), dtype=self.board_state_dtype)
+        self._board_state_valid = True
         self.done = False
+        # 提前判定结束时双方确定的目数(黑, 白)，未提前判定时为None
+        self.settled_areas = None
+        # 当前局面的派生数据缓存（有效落子位置及其id、非真眼有效位置、目数、胜方），落子、悔棋、重置后失效
+        self._derived = {}
+        # push的撤销记录，供pop原地撤销落子
+        self.undo_log = []
+        # 局面快照，以步数为键，snapshots[k]为第k步后的局面，用于悔棋及重建历史局面。
+        # step在步数为snapshot_interval的整数倍时保存快照，push不保存，因此push后fork出的游戏状态中间可能缺少快照
+        self.snapshots = {0: self._snapshot()}
+        # action_history及snapshots是否与fork出的游戏状态共用，共用时修改前先复制
+        self._history_shared = False
 
     def reset(self) -> np.ndarray:
-        """重置current_state, board_state, board_state_history, action_history"""
-        self.current_state = gogame.init_state(self.board_size)
-        self.board_state = np.zeros((self.state_channels, self.board_size, self.board_size))
-        self.board_state_history = []
+        """重置current_state, board_state, action_history, snapshots"""
+        self.current_state = gogame.init_state(self.board_size, self.state_dtype)
+        self.board = Board(self.board_size, self.superko)
+        self.history_planes = np.zeros_like(self.history_planes)
+        self.history_heads = [0] * len(self.history_heads)
+        self._board_state_valid = False
         self.action_history = []
         self.done = False
-        return np.copy(self.current_state)
+        self.settled_areas = None
+        self._invalidate()
+        self.undo_log = []
+        self.snapshots = {0: self._snapshot()}
+        self._history_shared = False
+        return self._output(self.current_state)
 
     def step(self, action: Union[List[int], Tuple[int], int, None]) -> np.ndarray:
         """
@@ -78,6 +118,244 @@ class GoEngine:
         :return:
         """
         assert not self.done
+        action = self._action_1d(action)
+
+        self.current_state = gogame.next_state(self.current_state, action, canonical=False, board=self.board)
+        self._invalidate()
+        # 更新历史特征平面
+        self._update_state_step(action)
+        # 存储历史动作，并定期保存局面快照
+        self._own_history()
+        self.action_history.append(action)
+        if len(self.action_history) % self.snapshot_interval == 0:
+            self.snapshots[len(self.action_history)] = self._snapshot()
+        self._update_done()
+        return self._output(self.current_state)
+
+    def push(self, action: Union[List[int], Tuple[int], int, None]) -> None:
+        """
+        原地落子，并记录撤销落子所需的信息（落子及被提棋子位置、无效落子位置的变化、pass及结束标志、移出的历史特征平面），
+        与pop成对使用。供搜索模拟时沿搜索树向下落子、再原路撤销，无需每次模拟复制整个游戏状态
+        push不保存局面快照，push与pop之间不应调用step或regret
+
+        :param action: 下一步落子位置
+        :return:
+        """
+        assert not self.done
+        action = self._action_1d(action)
+        state = self.current_state
+        player = self.turn()
+        pass_idx = self.board_size ** 2
+        prev_passed, prev_done = state[govars.PASS_CHNL, 0, 0], state[govars.DONE_CHNL, 0, 0]
+
+        if action == pass_idx:
+            self.board.play(action, record=True)
+            killed = None
+            if prev_passed:
+                state[govars.DONE_CHNL] = 1
+            state[govars.PASS_CHNL] = 1
+        else:
+            assert state[govars.INVD_CHNL].flat[action] == 0, ("Invalid move", action)
+            state[player].flat[action] = 1
+            killed_groups = self.board.play(action, record=True)
+            killed = np.concatenate(killed_groups) if killed_groups else None
+            if killed is not None:
+                state[1 - player].flat[killed] = 0
+            state[govars.PASS_CHNL] = 0
+
+        # 只记录无效落子位置发生变化之处
+        invalid_moves = self.board.invalid_moves()
+        invd_delta = np.flatnonzero(state[govars.INVD_CHNL] != invalid_moves)
+        state[govars.INVD_CHNL].flat[invd_delta] = invalid_moves.flat[invd_delta]
+        state_utils.set_turn(state)
+
+        # 更新历史特征平面前，保存将被覆盖的最早平面
+        ring = player if self.state_format == "separated" else 0
+        dropped = np.copy(self.history_planes[ring, self.history_heads[ring]])
+        self._update_state_step(action)
+        self._own_history()
+        self.action_history.append(action)
+        self.undo_log.append((action, killed, invd_delta, prev_passed, prev_done, dropped))
+        self._update_done()
+        self._invalidate()
+
+    def pop(self) -> None:
+        """撤销最近一次push的落子"""
+        action, killed, invd_delta, prev_passed, prev_done, dropped = self.undo_log.pop()
+        self.board.undo()
+        state = self.current_state
+        state_utils.set_turn(state)
+        player = self.turn()
+
+        if action != self.board_size ** 2:
+            state[player].flat[action] = 0
+            if killed is not None:
+                state[1 - player].flat[killed] = 1
+        state[govars.PASS_CHNL] = prev_passed
+        state[govars.DONE_CHNL] = prev_done
+        state[govars.INVD_CHNL].flat[invd_delta] = np.logical_not(state[govars.INVD_CHNL].flat[invd_delta])
+
+        # 将该环的下标退回，并恢复被覆盖的平面
+        ring = player if self.state_format == "separated" else 0
+        self.history_heads[ring] = (self.history_heads[ring] - 1) % self.record_step
+        self.history_planes[ring, self.history_heads[ring]] = dropped
+        self._board_state_valid = False
+        self._own_history()
+        self.action_history.pop()
+        self.done = False
+        self.settled_areas = None
+        self._invalidate()
+
+    def regret(self) -> bool:
+        """
+        悔棋，撤销最近两步落子（双方各一步）
+
+        :return: 是否悔棋成功
+        """
+        if len(self.action_history) > 2:
+            self._restore(len(self.action_history) - 2)
+            return True
+        elif len(self.action_history) == 2:
+            self.reset()
+            return True
+        return False
+
+    def fork(self) -> 'GoEngine':
+        """
+        复制一个可独立落子的游戏状态，供搜索模拟使用。跳过构造函数，只复制当前局面、棋盘及历史特征平面，
+        动作历史、局面快照及superko局面哈希与原游戏状态共用，任一方修改时才复制（写时复制），
+        因此复制开销与对局步数无关
+
+        :return:
+        """
+        game_state = GoEngine.__new__(GoEngine)
+        game_state.__dict__.update(self.__dict__)
+        game_state.current_state = np.copy(self.current_state)
+        game_state.board = self.board.copy()
+        game_state.history_planes = np.copy(self.history_planes)
+        game_state.history_heads = list(self.history_heads)
+        game_state._board_state = np.copy(self._board_state)
+        # 派生数据均为只读数组或不可变对象，可以共用
+        game_state._derived = dict(self._derived)
+        game_state.undo_log = []
+        game_state._history_shared = self._history_shared = True
+        return game_state
+
+    def _own_history(self):
+        """修改action_history及snapshots前，如仍与fork出的游戏状态共用，先复制一份"""
+        if self._history_shared:
+            self.action_history = list(self.action_history)
+            self.snapshots = dict(self.snapshots)
+            self._history_shared = False
+
+    def _snapshot(self) -> tuple:
+        """当前局面的快照"""
+        return np.copy(self.current_state), self.board.copy(), np.copy(self.history_planes), list(self.history_heads)
+
+    def _restore(self, num_moves: int):
+        """
+        回到第num_moves步后的局面：从最近的快照出发，重放其后的动作，
+        使self.board（打劫点、局面哈希）及历史特征平面与正常落子得到的一致
+
+        :param num_moves: 保留的动作数
+        :return:
+        """
+        actions = self.action_history[:num_moves]
+        k = self._snapshot_before(num_moves)
+        self._own_history()
+        for later in [key for key in self.snapshots if key > k]:
+            del self.snapshots[later]
+        current_state, board, history_planes, history_heads = self.snapshots[k]
+        self.current_state, self.board = np.copy(current_state), board.copy()
+        self.history_planes, self.history_heads = np.copy(history_planes), list(history_heads)
+        self._board_state_valid = False
+        self.action_history = actions[:k]
+        self.done = False
+        self.settled_areas = None
+        self._invalidate()
+        self.undo_log = []
+        for action in actions[k:]:
+            self.step(action)
+
+    def _snapshot_before(self, num_moves: int) -> int:
+        """不晚于第num_moves步的最近一个快照的步数"""
+        return max(k for k in self.snapshots if k <= num_moves)
+
+    def state_at(self, num_moves: int) -> np.ndarray:
+        """
+        按需重建第num_moves步后的局面（current_state格式），不改变当前局面
+
+        :param num_moves: 从开局起的步数，不超过len(self.action_history)
+        :return:
+        """
+        assert 0 <= num_moves <= len(self.action_history)
+        k = self._snapshot_before(num_moves)
+        state, board = self.snapshots[k][:2]
+        state, board = np.copy(state), board.copy()
+        for action in self.action_history[k:num_moves]:
+            state = gogame.next_state(state, action, board=board)
+        return state
+
+    def _update_state_step(self, action: int):
+        """
+        将上一步落子方的棋子写入其历史特征平面环中最早的平面，并前移该环的下标，须在更新完self.current_state之后调用
+
+        :param action: 下一步落子位置，1d-action
+        :return:
+        """
+        # 根据更新过后的self.current_state，上一步落子方为下一步落子方的对手
+        player = 1 - self.turn()
+        if self.state_format == "separated":
+            ring = player
+            self.history_planes[ring, self.history_heads[ring]] = self.current_state[player]
+        else:
+            # 黑棋为1，白棋为-1
+            ring = 0
+            plane = self.history_planes[ring, self.history_heads[ring]]
+            plane[...] = self.current_state[govars.BLACK]
+            plane -= self.current_state[govars.WHITE]
+        self.history_heads[ring] = (self.history_heads[ring] + 1) % self.record_step
+        self._board_state_valid = False
+
+    @property
+    def board_state(self) -> np.ndarray:
+        """
+        神经网络输入的棋盘状态矩阵，按需由历史特征平面环拼装到复用缓冲区，每个环由最早到最近排列
+        separated：[黑棋×record_step，白棋×record_step，下一步落子方，上一步落子位置(可选)]
+        merged：[棋盘棋子分布×record_step，下一步落子方，上一步落子位置(可选)]
+        返回的是内部缓冲区，会随后续落子变化，不应修改
+        """
+        if not self._board_state_valid:
+            board_state = self._board_state
+            for ring, head in enumerate(self.history_heads):
+                channel = ring * self.record_step
+                board_state[channel:channel + self.record_step - head] = self.history_planes[ring, head:]
+                board_state[channel + self.record_step - head:channel + self.record_step] = \
+                    self.history_planes[ring, :head]
+            if self.record_last:
+                # 下一步落子方及上一步落子位置(上一步为pass时全为0)
+                board_state[-2] = self.current_state[govars.TURN_CHNL]
+                board_state[-1] = 0
+                if self.action_history and self.action_history[-1] != self.board_size ** 2:
+                    board_state[-1].flat[self.action_history[-1]] = 1
+            else:
+                board_state[-1] = self.current_state[govars.TURN_CHNL]
+            self._board_state_valid = True
+        return self._board_state
+
+    def _update_done(self):
+        """根据self.current_state更新游戏是否结束，启用adjudicate时所有位置归属均已确定也视为结束"""
+        self.done = bool(gogame.game_ended(self.current_state))
+        self.settled_areas = None
+        if self.adjudicate and not self.done:
+            # 先做廉价的必要条件检查：每个空点都须与棋子相邻，才可能是某方确定的地域
+            empty = np.flatnonzero(self.board.color[:-1] == EMPTY)
+            if (self.board.color[self.board.neighbors[empty]] < EMPTY).any(axis=1).all():
+                self.settled_areas = gogame.settled_areas(self.current_state)
+                self.done = self.settled_areas is not None
+
+    def _action_1d(self, action: Union[List[int], Tuple[int], int, None]) -> int:
+        """将各种格式的落子位置转换成1d-action"""
         if isinstance(action, tuple) or isinstance(action, list) or isinstance(action, np.ndarray):
             assert 0 <= action[0] < self.board_size
             assert 0 <= action[1] < self.board_size
@@ -86,59 +364,43 @@ class GoEngine:
             assert 0 <= action <= self.board_size ** 2
         elif action is None:
             action = self.board_size ** 2
+        return action
 
-        self.current_state = gogame.next_state(self.current_state, action, canonical=False)
-        # 更新self.board_state
-        self.board_state = self._update_state_step(action)
-        # 存储历史状态
-        self.board_state_history.append(np.copy(self.current_state))
-        # 存储历史动作
-        self.action_history.append(action)
-        self.done = gogame.game_ended(self.current_state)
-        return np.copy(self.current_state)
+    def get_board_state(self) -> np.ndarray:
+        """用于训练神经网络的棋盘状态矩阵"""
+        return self._output(self.board_state)
 
-    def _update_state_step(self, action: int) -> np.ndarray:
+    def _output(self, array: np.ndarray) -> np.ndarray:
+        """返回给调用方的数组：默认为副本，readonly_views模式下为不复制数据的只读视图"""
+        if not self.readonly_views:
+            return np.copy(array)
+        view = array.view()
+        view.flags.writeable = False
+        return view
+
+    def _invalidate(self):
+        """局面变化后，清除派生数据缓存"""
+        self._derived = {}
+
+    def _cached(self, key: str, fn):
         """
-        更新self.board_state，须在更新完self.current_state之后更新self.board_state
+        当前局面的派生数据，首次获取时由fn计算并缓存，数组设为只读
 
-        :param action: 下一步落子位置，1d-action
+        :param key: 派生数据名称
+        :param fn: 计算该数据的函数
         :return:
         """
-        if self.state_format == "separated":
-            # 根据上一步落子方更新self.board_state(因为self.current_state已经更新完毕)
-            if self.turn() == govars.WHITE:
-                # 根据更新过后的self.current_state，下一步落子方为白方，则上一步落子方为黑方
-                self.board_state[:self.record_step - 1] = np.copy(self.board_state[1:self.record_step])
-                self.board_state[self.record_step - 1] = np.copy(self.current_state[govars.BLACK])
-            else:
-                # 根据更新过后的self.current_state，下一步落子方为黑方，则上一步落子方为白方
-                self.board_state[self.record_step: self.record_step * 2 - 1] = \
-                    np.copy(self.board_state[self.record_step + 1: self.record_step * 2])
-                self.board_state[self.record_step * 2 - 1] = np.copy(self.current_state[govars.WHITE])
-        elif self.state_format == "merged":
-            self.board_state[:self.record_step - 1] = np.copy(self.board_state[1:self.record_step])
-            current_state = self.current_state[[govars.BLACK, govars.WHITE]]
-            current_state[govars.WHITE] *= -1
-            self.board_state[self.record_step - 1] = np.sum(current_state, axis=0)
-
-        if self.record_last:
-            # 更新下一步落子方
-            self.board_state[-2] = np.copy(self.current_state[govars.TURN_CHNL])
-            # 更新上一步落子位置
-            self.board_state[-1] = np.zeros((self.board_size, self.board_size))
-            # 上一步不为pass
-            if action != self.board_size ** 2:
-                # 将action转换成position
-                position = action // self.board_size, action % self.board_size
-                self.board_state[-1, position[0], position[1]] = 1
-        else:
-            # 更新下一步落子方
-            self.board_state[-1] = np.copy(self.current_state[govars.TURN_CHNL])
-        return np.copy(self.board_state)
-
-    def get_board_state(self) -> np.ndarray:
-        """用于训练神经网络的棋盘状态矩阵"""
-        return np.copy(self.board_state)
+        value = self._derived.get(key)
+        if value is None:
+            value = fn()
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+            self._derived[key] = value
+        return value
+
+    def hash(self) -> np.uint64:
+        """当前局面的64位Zobrist哈希，包含下一步落子方及打劫点"""
+        return self.board.hash
 
     def game_ended(self) -> bool:
         """游戏是否结束"""
@@ -149,23 +411,19 @@ class GoEngine:
         if not self.done:
             return -1
         else:
-            winner = self.winning()
-            winner = govars.BLACK if winner == 1 else govars.WHITE
-            return winner
+            return self._cached('winner', lambda: govars.BLACK if self.winning() == 1 else govars.WHITE)
 
     def action_valid(self, action) -> bool:
         """判断action是否合法"""
         return self.valid_moves()[action]
 
     def valid_move_idcs(self) -> np.ndarray:
-        """下一步落子有效位置的id"""
-        valid_moves = self.valid_moves()
-        return np.argwhere(valid_moves).flatten()
+        """下一步落子有效位置的id（只读，缓存至局面变化）"""
+        return self._cached('valid_move_idcs', lambda: np.flatnonzero(self.valid_moves()))
 
     def advanced_valid_move_idcs(self) -> np.ndarray:
-        """下一步落子的非真眼有效位置的id"""
-        advanced_valid_moves = self.advanced_valid_moves()
-        return np.argwhere(advanced_valid_moves).flatten()
+        """下一步落子的非真眼有效位置的id（只读，缓存至局面变化）"""
+        return self._cached('advanced_valid_move_idcs', lambda: np.flatnonzero(self.advanced_valid_moves()))
 
     def uniform_random_action(self) -> np.ndarray:
         """随机选择落子位置"""
@@ -182,25 +440,31 @@ class GoEngine:
         return gogame.turn(self.current_state)
 
     def valid_moves(self) -> np.ndarray:
-        """下一步落子的有效位置"""
-        return gogame.valid_moves(self.current_state)
+        """下一步落子的有效位置（只读，缓存至局面变化）"""
+        return self._cached('valid_moves', lambda: gogame.valid_moves(self.current_state))
 
     def advanced_valid_moves(self):
-        """下一步落子的非真眼有效位置"""
-        valid_moves = 1 - self.current_state[govars.INVD_CHNL]
-        eyes_mask = 1 - self.eyes()
-        return np.append((valid_moves * eyes_mask).flatten(), 1)
+        """下一步落子的非真眼有效位置，pass始终有效（只读，缓存至局面变化）"""
+        return self._cached('advanced_valid_moves', self._advanced_valid_moves)
+
+    def _advanced_valid_moves(self):
+        valid_moves = self.current_state[govars.INVD_CHNL].flatten() == 0
+        valid_moves &= ~self.board.eyes[self.turn(), :-1]
+        return np.append(valid_moves, True)
 
     def winning(self):
         """
         当游戏结束之后，从黑方角度看待，上一步落子后，哪一方胜利
         黑胜：1 白胜：-1
         """
+        if self.settled_areas is not None:
+            black_area, white_area = self.settled_areas
+            return np.sign(black_area - white_area - self.komi)
         return gogame.winning(self.current_state, self.komi)
 
     def areas(self):
-        """black_area, white_area"""
-        return gogame.areas(self.current_state)
+        """black_area, white_area（缓存至局面变化）"""
+        return self._cached('areas', lambda: gogame.areas(self.current_state))
 
     def eyes(self):
         """
@@ -208,32 +472,9 @@ class GoEngine:
         1.如果在角上或者边上，则需要对应8个最近位置均有下一步落子方的棋子；
         2.如果不在边上和角上，则需要对应4个最近边全有下一步落子方的棋子，且至少有三个角有下一步落子方的棋子；
         3.所判断的位置没有棋子
+        由self.board在落子、提子时只更新变化位置周围3x3范围增量维护
         """
-        board_shape = self.current_state.shape[1:]
-
-        side_mask = np.zeros(board_shape)
-        side_mask[[0, -1], :] = 1
-        side_mask[:, [0, -1]] = 1
-        nonside_mask = 1 - side_mask
-
-        # 下一步落子方
-        next_player = self.turn()
-        # next_player的棋子分布矩阵
-        next_player_pieces = self.current_state[next_player]
-        # 棋盘所有有棋子的分布矩阵，有棋子则相应位置为1
-        all_pieces = np.sum(self.current_state[[govars.BLACK, govars.WHITE]], axis=0)
-        # 棋盘上所有空交叉点的分布矩阵，空交叉点位置为1
-        empties = 1 - all_pieces
-
-        # 对于边角位置
-        side_matrix = ndimage.convolve(next_player_pieces, eye_struct, mode='constant', cval=1) == 8
-        side_matrix = side_matrix * side_mask
-        # 对于非边角位置
-        nonside_matrix = ndimage.convolve(next_player_pieces, surround_struct, mode='constant', cval=1) == 4
-        nonside_matrix *= ndimage.convolve(next_player_pieces, corner_struct, mode='constant', cval=1) > 2
-        nonside_matrix = nonside_matrix * nonside_mask
-
-        return empties * (side_matrix + nonside_matrix)
+        return self.board.eyes[self.turn(), :-1].reshape(self.board_size, self.board_size).copy()
 
     def all_symmetries(self) -> List[np.ndarray]:
         """board_state的8种等价表示"""
@@ -5,7 +5,6 @@
 # @Software: PyCharm
 
 import numpy as np
-import copy
 from operator import itemgetter
 
 
@@ -15,7 +14,7 @@ def softmax(x):
     return probs
 
 
-def evaluate_rollout(simulate_game_state, rollout_policy_fn, limit=1000):
+def evaluate_rollout(simulate_game_state, rollout_policy_fn, limit=1000, adjudicate=False):
     """
     使用rollout_policy_fn玩游戏直至游戏结束或达到限制数，如果当前玩家获胜，则返回+1，对手胜则返回-1，和棋则返回0
     如果模拟次数超过限制游戏还没结束，则同样返回0
@@ -23,9 +22,11 @@ def evaluate_rollout(simulate_game_state, rollout_policy_fn, limit=1000):
     :param simulate_game_state: 模拟游戏状态
     :param rollout_policy_fn: 产生下一步各合法动作及其概率的函数
     :param limit: 限制模拟步数，超过这个限制还没结束，游戏视为和棋
+    :param adjudicate: 所有位置归属均已确定时是否提前结束模拟，见GoEngine的adjudicate参数
     :return:
     """
-    game_state_copy = copy.deepcopy(simulate_game_state)
+    game_state_copy = simulate_game_state.fork()
+    game_state_copy.adjudicate = game_state_copy.adjudicate or adjudicate
     player = game_state_copy.turn()
     for _ in range(limit):
         end, winner = game_state_copy.game_ended(), game_state_copy.winner()
@@ -141,17 +142,20 @@ class MCTS:
     def playout(self, simulate_game_state):
         """
         从根节点不断选择直到叶结点，并获取叶结点的值，反向传播到叶结点的祖先节点
+        模拟游戏沿搜索路径原地落子（push），模拟结束后原路撤销（pop），回到根节点局面供下一次模拟复用
 
         :param simulate_game_state: 模拟游戏对象
         :return:
         """
         node = self.root
+        depth = 0
         while True:  # 从根节点一直定位到叶结点
             if node.is_leaf():
                 break
             # 贪婪地选择下一步动作
             action, node = node.select(self.c_puct)
-            simulate_game_state.step(action)
+            simulate_game_state.push(action)
+            depth += 1
         # 使用网络来评估叶结点，产生一个每一个元素均为(action, probability)元组的列表，以及
         # 一个以当前玩家视角看待的在[-1, 1]之间的v值
         action_probs, leaf_value = self.policy(simulate_game_state)
@@ -170,6 +174,8 @@ class MCTS:
         # 这里的值要符号反转，因为这个值是根据根节点的player视角来得到的
         # 但是做出下一步落子的是根节点对应player的对手
         node.update_recursive(-leaf_value)
+        for _ in range(depth):
+            simulate_game_state.pop()
 
     def get_move_probs(self, game, temp=1e-3, player=None):
         """
@@ -180,17 +186,12 @@ class MCTS:
         :param player: 调用该函数的player，用于进行进度绘制
         :return:
         """
-        for i in range(self.n_playout):
-            if not player.valid:
-                return -1, -1
-            if player is not None:
-                player.speed = (i + 1, self.n_playout)
-            simulate_game_state = game.game_state_simulator(player.is_selfplay)
-            self.playout(simulate_game_state)
+        # 所有模拟共用一个模拟游戏，每次模拟后均回到根节点局面
+        simulate_game_state = game.game_state_simulator(player.is_selfplay)
+        if not self.search(simulate_game_state, player):
+            return -1, -1
         # 基于节点访问次数，计算每个动作对应的概率
-        act_visits = [(act, node.n_visits)
-                      for act, node in self.root.children.items()]
-        acts, visits = zip(*act_visits)
+        acts, visits = self.root_visits()
         act_probs = softmax(1.0 / temp * np.log(np.array(visits) + 1e-10))
         return acts, act_probs
 
@@ -202,14 +203,38 @@ class MCTS:
         :param player: 调用该函数的player，用于进行进度绘制
         :return: 返回访问次数最多的动作
         """
+        game_state = game.game_state_simulator()
+        if not self.search(game_state, player):
+            return -1
+        acts, visits = self.root_visits()
+        return acts[int(np.argmax(visits))]
+
+    def search(self, simulate_game_state, player=None):
+        """
+        执行n_playout次模拟
+
+        :param simulate_game_state: 模拟游戏对象
+        :param player: 调用该函数的player，用于进行进度绘制
+        :return: 是否完成全部模拟，player.valid变为False时中断
+        """
         for i in range(self.n_playout):
-            if not player.valid:
-                return -1
             if player is not None:
+                if not player.valid:
+                    return False
                 player.speed = (i + 1, self.n_playout)
-            game_state = game.game_state_simulator()
-            self.playout(game_state)
-        return max(self.root.children.items(), key=lambda act_node: act_node[1].n_visits)[0]
+            self.playout(simulate_game_state)
+        return True
+
+    def root_visits(self):
+        """
+        根节点各子节点对应的动作及访问次数
+
+        :return: 返回元组(acts, visits)
+        """
+        act_visits = [(act, node.n_visits)
+                      for act, node in self.root.children.items()]
+        acts, visits = zip(*act_visits)
+        return acts, visits
 
     def update_with_move(self, last_move):
         """
@@ -223,3 +248,277 @@ class MCTS:
             self.root.parent = None
         else:
             self.root = TreeNode(None, 1.0)
+
+
+class ArrayMCTS(MCTS):
+    """
+    数组实现的蒙特卡洛树搜索，可替代MCTS，接口相同
+    所有节点的访问次数N、总价值W、平均价值Q、先验概率P、父节点、动作及子节点区间保存在预分配的numpy数组中，
+    同一节点的子节点连续存放，选择时对子节点区间做一次向量化的argmax，反向传播时按搜索路径的下标更新，
+    扩展时不再为每个子节点创建对象
+    batch_size大于1时，每轮沿K条路径向下选择，路径上施加虚拟损失使各路径分散，
+    再由batch_policy_value_fn一次评估K个叶结点，最后逐条扩展并反向传播
+    """
+    def __init__(self, policy_value_fn, c_puct=5, n_playout=10000, capacity=4096,
+                 batch_size=1, batch_policy_value_fn=None, virtual_loss=1):
+        """
+        :param capacity: 初始预分配的节点数，不够时成倍扩充
+        :param batch_size: 每轮同时评估的叶结点数K，为1时逐个评估，与MCTS相同
+        :param batch_policy_value_fn: batch_size大于1时使用的评估函数，输入为K个叶结点的棋盘状态矩阵(K, C, N, N)
+                                      及各自的合法动作列表，返回K个(action_probs, value)元组，见PolicyValueNet
+        :param virtual_loss: 选择路径上每个节点暂时增加的访问次数及减少的价值
+        """
+        super().__init__(policy_value_fn, c_puct, n_playout)
+        assert batch_size == 1 or batch_policy_value_fn is not None
+        self.batch_size = batch_size
+        self.batch_policy = batch_policy_value_fn
+        self.virtual_loss = virtual_loss
+        self.root = None
+        self._reset_tree(capacity)
+
+    def _reset_tree(self, capacity):
+        """清空搜索树，只保留一个根节点"""
+        self.N = np.zeros(capacity, dtype=np.int64)  # 节点被访问的次数
+        self.W = np.zeros(capacity)  # 节点的总行动价值
+        self.Q = np.zeros(capacity)  # 节点的平均行动价值
+        self.P = np.zeros(capacity)  # 节点被选择的先验概率
+        self.parent = np.full(capacity, -1, dtype=np.int64)  # 父节点下标，根节点为-1
+        self.action = np.full(capacity, -1, dtype=np.int64)  # 从父节点到达该节点的动作
+        self.first_child = np.zeros(capacity, dtype=np.int64)  # 第一个子节点的下标
+        self.num_children = np.zeros(capacity, dtype=np.int64)  # 子节点数，为0表示叶结点
+        self.P[0] = 1.0
+        self.root = 0
+        self.size = 1
+
+    def _allocate(self, n):
+        """
+        分配n个连续的节点，容量不够时成倍扩充所有数组
+
+        :return: 第一个节点的下标
+        """
+        capacity = len(self.N)
+        if self.size + n > capacity:
+            new_capacity = max(2 * capacity, self.size + n)
+            for name in ['N', 'W', 'Q', 'P', 'parent', 'action', 'first_child', 'num_children']:
+                array = getattr(self, name)
+                new_array = np.zeros(new_capacity, dtype=array.dtype)
+                new_array[:capacity] = array
+                setattr(self, name, new_array)
+        start = self.size
+        self.size += n
+        return start
+
+    def playout(self, simulate_game_state):
+        """
+        与MCTS.playout相同，子节点的选择为对子节点区间Q+U的一次argmax
+
+        :param simulate_game_state: 模拟游戏对象
+        :return:
+        """
+        node = self.root
+        path = [node]
+        while self.num_children[node] > 0:  # 从根节点一直定位到叶结点
+            node = self._select(node)
+            simulate_game_state.push(int(self.action[node]))
+            path.append(node)
+        action_probs, leaf_value = self.policy(simulate_game_state)
+        end, winner = simulate_game_state.game_ended(), simulate_game_state.winner()
+        if not end:  # 没结束则扩展
+            self._expand(node, action_probs)
+        else:
+            if winner == -1:  # 和棋
+                leaf_value = 0.0
+            else:
+                leaf_value = (
+                    1.0 if winner == simulate_game_state.turn() else -1.0
+                )
+        self._backup(np.array(path), float(leaf_value))
+        for _ in range(len(path) - 1):
+            simulate_game_state.pop()
+
+    def _select(self, node):
+        """贪婪地选择Q+U最大的子节点，并列时取第一个，与MCTS一致"""
+        start = self.first_child[node]
+        stop = start + self.num_children[node]
+        u = self.c_puct * self.P[start:stop] * np.sqrt(self.N[node]) / (1 + self.N[start:stop])
+        return start + int(np.argmax(self.Q[start:stop] + u))
+
+    def _backup(self, path, leaf_value):
+        """
+        更新搜索路径上节点的访问次数和价值，叶结点的价值为-leaf_value，每向上一层价值反转一次
+
+        :param path: 从根节点到叶结点的节点下标
+        :param leaf_value: 以叶结点局面下一步落子方视角看待的价值
+        :return:
+        """
+        values = np.where(np.arange(len(path))[::-1] % 2 == 0, -leaf_value, leaf_value)
+        self.N[path] += 1
+        self.W[path] += values
+        self.Q[path] = self.W[path] / self.N[path]
+
+    def _add_virtual_loss(self, path, virtual_loss):
+        """
+        路径上每个节点视为多被访问virtual_loss次，且每次都是到达该节点的落子方输棋；virtual_loss为负数时撤销
+
+        :param path: 从根节点到叶结点的节点下标
+        :param virtual_loss: 虚拟损失
+        :return:
+        """
+        self.N[path] += virtual_loss
+        self.W[path] -= virtual_loss
+        self.Q[path] = np.where(self.N[path] > 0, self.W[path] / np.maximum(self.N[path], 1), 0)
+
+    def search(self, simulate_game_state, player=None):
+        """
+        执行n_playout次模拟，batch_size大于1时每轮批量评估batch_size个叶结点
+
+        :param simulate_game_state: 模拟游戏对象
+        :param player: 调用该函数的player，用于进行进度绘制
+        :return: 是否完成全部模拟，player.valid变为False时中断
+        """
+        if self.batch_size == 1:
+            return super().search(simulate_game_state, player)
+        num_playouts = 0
+        while num_playouts < self.n_playout:
+            if player is not None and not player.valid:
+                return False
+            num_playouts += self.batch_playout(simulate_game_state,
+                                               min(self.batch_size, self.n_playout - num_playouts))
+            if player is not None:
+                player.speed = (num_playouts, self.n_playout)
+        return True
+
+    def batch_playout(self, simulate_game_state, num_paths):
+        """
+        沿num_paths条路径各模拟一次：每条路径选择到叶结点后，记录叶结点的棋盘状态矩阵及合法动作，
+        并在路径上施加虚拟损失，使后续路径倾向于选择其它节点；随后一次评估所有未结束的叶结点，
+        撤销虚拟损失，扩展叶结点并反向传播。
+        到达本轮已待评估叶结点的路径只撤销虚拟损失，不计入模拟次数，与逐个模拟时一致：叶结点扩展前只被访问一次。
+        因此搜索树只有根节点时，本轮只评估根节点一次
+
+        :param simulate_game_state: 模拟游戏对象
+        :param num_paths: 本轮的路径数
+        :return: 本轮实际完成（反向传播）的模拟次数
+        """
+        paths, leaf_values, pending, duplicates = [], [], {}, []
+        for _ in range(num_paths):
+            node = self.root
+            path = [node]
+            while self.num_children[node] > 0:
+                node = self._select(node)
+                simulate_game_state.push(int(self.action[node]))
+                path.append(node)
+            end, winner = simulate_game_state.game_ended(), simulate_game_state.winner()
+            leaf_value = None
+            duplicate = not end and node in pending
+            if end:
+                if winner == -1:  # 和棋
+                    leaf_value = 0.0
+                else:
+                    leaf_value = 1.0 if winner == simulate_game_state.turn() else -1.0
+            elif not duplicate:
+                # 复制一份：board_state是复用的缓冲区（readonly_views模式下get_board_state返回其视图），会随后续的pop变化
+                pending[node] = (np.copy(simulate_game_state.board_state), simulate_game_state.valid_move_idcs())
+            for _ in range(len(path) - 1):
+                simulate_game_state.pop()
+            path = np.array(path)
+            self._add_virtual_loss(path, self.virtual_loss)
+            if duplicate:
+                duplicates.append(path)
+            else:
+                paths.append(path)
+                leaf_values.append(leaf_value)
+
+        evaluations = {}
+        if pending:
+            nodes = list(pending)
+            board_states = np.stack([pending[node][0] for node in nodes])
+            legal_positions = [pending[node][1] for node in nodes]
+            for node, (action_probs, value) in zip(nodes, self.batch_policy(board_states, legal_positions)):
+                self._expand(node, action_probs)
+                evaluations[node] = value
+
+        for path in duplicates:
+            self._add_virtual_loss(path, -self.virtual_loss)
+        for path, leaf_value in zip(paths, leaf_values):
+            # 撤销虚拟损失，再用实际价值更新
+            self._add_virtual_loss(path, -self.virtual_loss)
+            if leaf_value is None:
+                leaf_value = evaluations[path[-1]]
+            self._backup(path, leaf_value)
+        return len(paths)
+
+    def _expand(self, node, action_priors):
+        """
+        为叶结点node分配一段连续的子节点
+
+        :param action_priors: 每一个元素为 特定动作及其先验概率 的元组
+        :return:
+        """
+        action_priors = list(action_priors)
+        if not action_priors:
+            return
+        actions, priors = zip(*action_priors)
+        start = self._allocate(len(actions))
+        stop = start + len(actions)
+        self.action[start:stop] = actions
+        self.P[start:stop] = priors
+        self.N[start:stop] = 0
+        self.W[start:stop] = 0
+        self.Q[start:stop] = 0
+        self.num_children[start:stop] = 0
+        self.parent[start:stop] = node
+        self.first_child[node] = start
+        self.num_children[node] = len(actions)
+
+    def root_visits(self):
+        """
+        根节点各子节点对应的动作及访问次数
+
+        :return: 返回元组(acts, visits)
+        """
+        start = self.first_child[self.root]
+        stop = start + self.num_children[self.root]
+        return tuple(self.action[start:stop].tolist()), self.N[start:stop]
+
+    def update_with_move(self, last_move):
+        """
+        蒙特卡洛搜索树向深层前进一步，保留对应子树，并将子树按层序压缩到数组开头，释放其余节点
+
+        :param last_move: 上一步选择的动作
+        :return:
+        """
+        start = self.first_child[self.root]
+        children = np.arange(start, start + self.num_children[self.root])
+        matched = children[self.action[children] == last_move]
+        if len(matched) == 0:
+            self._reset_tree(len(self.N))
+            return
+
+        # 逐层收集子树节点，同一节点的子节点在下一层中仍连续
+        levels = [matched]
+        while True:
+            frontier = levels[-1]
+            counts = self.num_children[frontier]
+            counts = counts[counts > 0]
+            if len(counts) == 0:
+                break
+            starts = self.first_child[frontier][self.num_children[frontier] > 0]
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            levels.append(np.repeat(starts, counts) + offsets)
+        old = np.concatenate(levels)
+        remap = np.full(self.size, -1, dtype=np.int64)
+        remap[old] = np.arange(len(old))
+
+        for name in ['N', 'W', 'Q', 'P', 'action', 'num_children']:
+            array = getattr(self, name)
+            array[:len(old)] = array[old]
+        first_child = self.first_child[old]
+        has_children = self.num_children[:len(old)] > 0
+        self.first_child[:len(old)] = 0
+        self.first_child[:len(old)][has_children] = remap[first_child[has_children]]
+        # 新根节点之外的节点都在子树内，父节点均可重新映射
+        self.parent[1:len(old)] = remap[self.parent[old[1:]]]
+        self.parent[0] = -1
+        self.root = 0
+        self.size = len(old)
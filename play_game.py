@@ -4,13 +4,28 @@
 # @File    : play_game.py
 # @Software: PyCharm
 
+import time
+start_time = time.perf_counter()
+
 from game_engine import GameEngine
 import pygame
 import sys
 
+import_time = time.perf_counter()
+
+
+def startup_report():
+    """启动耗时报告：导入模块及初始化游戏界面的耗时，以及启动时已导入的重型模块"""
+    ready_time = time.perf_counter()
+    heavy_modules = [module for module in ['paddle', 'scipy', 'sklearn'] if module in sys.modules]
+    print('启动耗时：{:.2f}秒（导入模块{:.2f}秒，初始化界面{:.2f}秒），已导入的重型模块：{}'.format(
+        ready_time - start_time, import_time - start_time, ready_time - import_time,
+        '、'.join(heavy_modules) if heavy_modules else '无'), flush=True)
+
 
 if __name__ == '__main__':
     game = GameEngine()
+    startup_report()
 
     while True:
         for event in pygame.event.get():
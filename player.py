@@ -7,12 +7,29 @@
 from threading import Thread
 import numpy as np
 from time import sleep
-from mcts import MCTS, evaluate_rollout
-from policy_value_net import PolicyValueNet
-import paddle
+from mcts import MCTS, ArrayMCTS, evaluate_rollout
 import os
 
 
+def load_policy_value_net(model_path):
+    """
+    创建策略价值网络，并加载model_path处的参数（如果存在）
+    paddle在此时才导入，人人对弈、随机落子及蒙特卡洛玩家无需导入paddle
+
+    :param model_path: 模型参数路径
+    :return:
+    """
+    import paddle
+    from policy_value_net import PolicyValueNet
+
+    policy_value_net = PolicyValueNet()
+    if os.path.exists(model_path):
+        state_dict = paddle.load(model_path)
+        policy_value_net.set_state_dict(state_dict)
+    policy_value_net.eval()
+    return policy_value_net
+
+
 class Player:
     def __init__(self):
         # 是否允许启动线程计算下一步action标记
@@ -66,7 +83,7 @@ class RandomPlayer(Player):
 
 
 class MCTSPlayer(Player):
-    def __init__(self, c_puct=5, n_playout=20):
+    def __init__(self, c_puct=5, n_playout=20, adjudicate=False, array_tree=True):
         super().__init__()
         self.name = '蒙特卡洛{}'.format(n_playout)
 
@@ -80,9 +97,11 @@ class MCTSPlayer(Player):
             # 返回均匀概率及通过随机方法获得的节点价值
             availables = game_state_simulator.valid_move_idcs()
             action_probs = np.ones(len(availables)) / len(availables)
-            return zip(availables, action_probs), evaluate_rollout(game_state_simulator, rollout_policy_fn)
+            value = evaluate_rollout(game_state_simulator, rollout_policy_fn, adjudicate=adjudicate)
+            return zip(availables, action_probs), value
 
-        self.mcts = MCTS(policy_value_fn, c_puct, n_playout)
+        # array_tree为True时使用数组实现的搜索树ArrayMCTS，搜索结果与MCTS相同
+        self.mcts = (ArrayMCTS if array_tree else MCTS)(policy_value_fn, c_puct, n_playout)
 
     def step(self, game):
         action = self.get_action(game)
@@ -104,7 +123,8 @@ class MCTSPlayer(Player):
 
 
 class AlphaGoPlayer(Player):
-    def __init__(self, model_path='models/pdparams', c_puct=5, n_playout=400, is_selfplay=False):
+    def __init__(self, model_path='models/pdparams', c_puct=5, n_playout=400, is_selfplay=False, array_tree=True,
+                 eval_batch_size=1):
         super(AlphaGoPlayer, self).__init__()
         if model_path == 'models/alpha_go.pdparams':
             self.name = '阿尔法狗'
@@ -112,14 +132,16 @@ class AlphaGoPlayer(Player):
             self.name = '幼生阿尔法狗'
         else:
             self.name = '预期之外的错误名称'
-        self.policy_value_net = PolicyValueNet()
-        self.policy_value_net.eval()
-
-        if os.path.exists(model_path):
-            state_dict = paddle.load(model_path)
-            self.policy_value_net.set_state_dict(state_dict)
-
-        self.mcts = MCTS(self.policy_value_net.policy_value_fn, c_puct, n_playout)
+        self.policy_value_net = load_policy_value_net(model_path)
+
+        if eval_batch_size > 1:
+            # 每轮选择eval_batch_size个叶结点，由策略价值网络一次前向计算批量评估，仅ArrayMCTS支持
+            assert array_tree, "eval_batch_size > 1 requires array_tree"
+            self.mcts = ArrayMCTS(self.policy_value_net.policy_value_fn, c_puct, n_playout,
+                                  batch_size=eval_batch_size,
+                                  batch_policy_value_fn=self.policy_value_net.batch_policy_value_fn)
+        else:
+            self.mcts = (ArrayMCTS if array_tree else MCTS)(self.policy_value_net.policy_value_fn, c_puct, n_playout)
         self.is_selfplay = is_selfplay
 
     def reset_player(self):
@@ -157,18 +179,14 @@ class PolicyNetPlayer(Player):
     def __init__(self, model_path='models/model.pdparams'):
         super(PolicyNetPlayer, self).__init__()
         self.name = '策略网络'
-        self.policy_value_net = PolicyValueNet()
-
-        if os.path.exists(model_path):
-            state_dict = paddle.load(model_path)
-            self.policy_value_net.set_state_dict(state_dict)
-        self.policy_value_net.eval()
+        self.policy_value_net = load_policy_value_net(model_path)
 
     def step(self, game):
         sleep(1)
         self.action = self.get_action(game)
 
     def get_action(self, game):
+        import paddle
         valid_moves = game.game_state.valid_moves()
         valid_moves = paddle.to_tensor(valid_moves)
 
@@ -187,28 +205,24 @@ class ValueNetPlayer(Player):
     def __init__(self, model_path='models/model.pdparams'):
         super(ValueNetPlayer, self).__init__()
         self.name = '价值网络'
-        self.policy_value_net = PolicyValueNet()
-
-        if os.path.exists(model_path):
-            state_dict = paddle.load(model_path)
-            self.policy_value_net.set_state_dict(state_dict)
-        self.policy_value_net.eval()
+        self.policy_value_net = load_policy_value_net(model_path)
 
     def step(self, game):
         sleep(1)
         self.action = self.get_action(game)
 
     def get_action(self, game):
+        import paddle
         valid_move_idcs = game.game_state.valid_move_idcs()
 
         # 计算所有可落子位置，对手的局面价值，选择对手局面价值最小的落子
         max_value = 1
         action = game.board_size ** 2
+        simulate_game_state = game.game_state_simulator()
         for simulate_action in valid_move_idcs:
-            simulate_game_state = game.game_state_simulator()
-            simulate_game_state.step(simulate_action)
-
+            simulate_game_state.push(simulate_action)
             current_state = simulate_game_state.get_board_state()
+            simulate_game_state.pop()
             current_state = paddle.to_tensor([current_state], dtype='float32')
 
             _, value = self.policy_value_net(current_state)
@@ -66,7 +66,22 @@ class PolicyValueNet(paddle.nn.Layer):
         :return:
         """
         legal_positions = simulate_game_state.valid_move_idcs()
-        current_state = paddle.to_tensor(simulate_game_state.get_board_state()[np.newaxis], dtype='float32')
+        # 棋盘状态可能为紧凑的uint8/bool类型，仅在送入网络时转换为float32
+        current_state = paddle.to_tensor(simulate_game_state.get_board_state()[np.newaxis].astype(np.float32))
         act_probs, value = self.forward(current_state)
         act_probs = zip(legal_positions, act_probs.numpy().flatten()[legal_positions])
-        return act_probs, value
+        return act_probs, float(value.numpy().flatten()[0])
+
+    def batch_policy_value_fn(self, board_states, legal_positions):
+        """
+        一次前向计算评估多个局面，供ArrayMCTS批量评估叶结点
+
+        :param board_states: 多个局面的棋盘状态矩阵，shape为(K, C, N, N)
+        :param legal_positions: 各局面合法动作的列表
+        :return: K个(action_probs, value)元组
+        """
+        # 棋盘状态可能为紧凑的uint8/bool类型，仅在送入网络时转换为float32
+        act_probs, values = self.forward(paddle.to_tensor(board_states.astype(np.float32)))
+        act_probs, values = act_probs.numpy(), values.numpy().flatten()
+        return [(zip(legal, probs[legal]), float(value))
+                for legal, probs, value in zip(legal_positions, act_probs, values)]
@@ -0,0 +1,35 @@
+import copy
+import time
+import unittest
+
+import numpy as np
+
+import go_engine
+
+
+class Efficiency(unittest.TestCase):
+
+    def testGameStateFork(self):
+        # GoEngine.fork against the copy.deepcopy the search simulators used before, early and late in a game
+        for boardsize in [9, 19]:
+            np.random.seed(0)
+            game_state = go_engine.GoEngine(board_size=boardsize, superko=True)
+            for num_moves in range(3 * boardsize ** 2 // 2 + 1):
+                if num_moves in [boardsize ** 2 // 4, 3 * boardsize ** 2 // 2]:
+                    durs = {}
+                    for name, fork in [('fork', game_state.fork), ('deepcopy', lambda: copy.deepcopy(game_state))]:
+                        start = time.time()
+                        for _ in range(200):
+                            fork()
+                        durs[name] = (time.time() - start) / 200
+                    print(f"{boardsize}x{boardsize} after {num_moves} moves: {durs['fork'] * 1e6:.1f} us fork, "
+                          f"{durs['deepcopy'] * 1e6:.1f} us deepcopy", flush=True)
+                valid_moves = np.copy(game_state.valid_moves())
+                # Do not pass if possible
+                if np.sum(valid_moves) > 1:
+                    valid_moves[-1] = 0
+                game_state.step(np.random.choice(np.flatnonzero(valid_moves)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,256 @@
+import unittest
+
+import numpy as np
+
+import go_engine
+from GymGo.gym_go import govars
+
+
+def random_action(game_state):
+    valid_moves = np.copy(game_state.valid_moves())
+    # Do not pass if possible
+    if np.sum(valid_moves) > 1:
+        valid_moves[-1] = 0
+    return np.random.choice(np.flatnonzero(valid_moves))
+
+
+def stack_and_roll(board_state, current_state, action, record_step, state_format, record_last):
+    """
+    The feature planes of the next move, as the engine computed them before the ring buffers:
+    shift the planes of the player who just moved by one and append the new position
+    """
+    board_state = np.copy(board_state)
+    size = current_state.shape[-1]
+    if state_format == "separated":
+        player = 1 - int(current_state[govars.TURN_CHNL, 0, 0])
+        first = player * record_step
+        board_state[first:first + record_step - 1] = board_state[first + 1:first + record_step]
+        board_state[first + record_step - 1] = current_state[player]
+    else:
+        board_state[:record_step - 1] = board_state[1:record_step]
+        board_state[record_step - 1] = current_state[govars.BLACK] - current_state[govars.WHITE]
+    if record_last:
+        board_state[-2] = current_state[govars.TURN_CHNL]
+        board_state[-1] = 0
+        if action != size ** 2:
+            board_state[-1, action // size, action % size] = 1
+    else:
+        board_state[-1] = current_state[govars.TURN_CHNL]
+    return board_state
+
+
+class TestGoEngine(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def setUp(self):
+        np.random.seed(0)
+
+    def assert_same_position(self, game_state, other):
+        self.assertTrue((game_state.current_state == other.current_state).all())
+        self.assertTrue((game_state.board_state == other.board_state).all())
+        self.assertTrue((game_state.valid_moves() == other.valid_moves()).all())
+        self.assertEqual(game_state.action_history, other.action_history)
+        self.assertEqual(game_state.board.history, other.board.history)
+        self.assertEqual(game_state.hash(), other.hash())
+        self.assertEqual(game_state.game_ended(), other.game_ended())
+
+    def test_push_pop(self):
+        for state_format in ['separated', 'merged']:
+            game_state = go_engine.GoEngine(board_size=5, state_format=state_format, superko=True)
+            for _ in range(60):
+                if game_state.game_ended():
+                    break
+                current_state = np.copy(game_state.current_state)
+                board_state = np.copy(game_state.board_state)
+                valid_moves = np.copy(game_state.valid_moves())
+                action_history = list(game_state.action_history)
+                superko_history = set(game_state.board.history)
+
+                # Walk a few moves down and back up, like a playout
+                depth = 0
+                for _ in range(4):
+                    if game_state.game_ended():
+                        break
+                    game_state.push(game_state.uniform_random_action())
+                    depth += 1
+                for _ in range(depth):
+                    game_state.pop()
+
+                self.assertTrue((game_state.current_state == current_state).all())
+                self.assertTrue((game_state.board_state == board_state).all())
+                self.assertTrue((game_state.valid_moves() == valid_moves).all())
+                self.assertEqual(game_state.action_history, action_history)
+                self.assertEqual(game_state.board.history, superko_history)
+                self.assertFalse(game_state.game_ended())
+
+                game_state.step(random_action(game_state))
+
+    def test_push_matches_step(self):
+        for state_format in ['separated', 'merged']:
+            game_state = go_engine.GoEngine(board_size=5, state_format=state_format, superko=True)
+            for _ in range(60):
+                if game_state.game_ended():
+                    break
+                action = random_action(game_state)
+                stepped = game_state.fork()
+                stepped.step(action)
+                game_state.push(action)
+                self.assert_same_position(game_state, stepped)
+
+    def test_state_at_and_regret(self):
+        # 80 moves cross the snapshots taken every 32 moves
+        game_state = go_engine.GoEngine(board_size=7, superko=True)
+        actions, states, board_states, superko_histories = [], [], [], []
+        for _ in range(80):
+            states.append(np.copy(game_state.current_state))
+            board_states.append(np.copy(game_state.board_state))
+            superko_histories.append(set(game_state.board.history))
+            actions.append(random_action(game_state))
+            game_state.step(actions[-1])
+        self.assertEqual(len(game_state.snapshots), 3)
+
+        for num_moves in range(len(actions)):
+            self.assertTrue((game_state.state_at(num_moves) == states[num_moves]).all(), num_moves)
+
+        # Take back two moves at a time, down across both snapshots
+        num_moves = len(actions)
+        while num_moves > 10:
+            self.assertTrue(game_state.regret())
+            num_moves -= 2
+            self.assertEqual(game_state.action_history, actions[:num_moves])
+            self.assertTrue((game_state.current_state == states[num_moves]).all(), num_moves)
+            self.assertTrue((game_state.board_state == board_states[num_moves]).all(), num_moves)
+            self.assertEqual(game_state.board.history, superko_histories[num_moves])
+
+        # Play on with other moves, the same as a game that never took back any
+        for _ in range(60):
+            game_state.step(random_action(game_state))
+        replayed = go_engine.GoEngine(board_size=7, superko=True)
+        for action in game_state.action_history:
+            replayed.step(action)
+        self.assert_same_position(game_state, replayed)
+        self.assertEqual(len(game_state.snapshots), len(replayed.snapshots))
+        for num_moves in range(len(game_state.action_history)):
+            self.assertTrue((game_state.state_at(num_moves) == replayed.state_at(num_moves)).all(), num_moves)
+
+    def test_history_planes(self):
+        # 12 moves fill the rings of 3 planes several times over
+        for state_format in ['separated', 'merged']:
+            for record_last in [True, False]:
+                for state_dtype in [np.float64, np.uint8, np.bool_]:
+                    game_state = go_engine.GoEngine(board_size=5, record_step=3, state_format=state_format,
+                                                    record_last=record_last, state_dtype=state_dtype)
+                    expected = np.zeros(game_state.board_state.shape)
+                    for _ in range(12):
+                        if game_state.game_ended():
+                            break
+                        action = game_state.uniform_random_action()
+                        game_state.step(action)
+                        expected = stack_and_roll(expected, game_state.current_state.astype(np.float64), action, 3,
+                                                  state_format, record_last)
+                        board_state = game_state.get_board_state()
+                        self.assertEqual(board_state.dtype, game_state.board_state_dtype)
+                        self.assertTrue((board_state.astype(np.float64) == expected).all(),
+                                        (state_format, record_last, state_dtype))
+
+    def test_fork(self):
+        game_state = go_engine.GoEngine(board_size=5, superko=True, snapshot_interval=8)
+        for _ in range(20):
+            game_state.step(random_action(game_state))
+        current_state = np.copy(game_state.current_state)
+        board_state = np.copy(game_state.board_state)
+        action_history = list(game_state.action_history)
+        num_snapshots = len(game_state.snapshots)
+        superko_history = set(game_state.board.history)
+
+        # The fork steps, pushes, pops and takes back moves without touching its parent
+        forked = game_state.fork()
+        for _ in range(10):
+            forked.step(random_action(forked))
+            forked.push(random_action(forked))
+            forked.pop()
+        forked.regret()
+        self.assertTrue((game_state.current_state == current_state).all())
+        self.assertTrue((game_state.board_state == board_state).all())
+        self.assertEqual(game_state.action_history, action_history)
+        self.assertEqual(len(game_state.snapshots), num_snapshots)
+        self.assertEqual(game_state.board.history, superko_history)
+
+        # Nor does the parent touch the fork
+        forked_state = np.copy(forked.current_state)
+        forked_history = list(forked.action_history)
+        forked_superko_history = set(forked.board.history)
+        for _ in range(10):
+            game_state.step(random_action(game_state))
+        self.assertTrue((forked.current_state == forked_state).all())
+        self.assertEqual(forked.action_history, forked_history)
+        self.assertEqual(forked.board.history, forked_superko_history)
+
+    def test_fork_after_push(self):
+        # A fork taken in the middle of a playout has moves that were pushed, without their snapshots
+        game_state = go_engine.GoEngine(board_size=7, superko=True, snapshot_interval=8)
+        for _ in range(6):
+            game_state.step(random_action(game_state))
+        for _ in range(4):
+            game_state.push(random_action(game_state))
+        forked = game_state.fork()
+        for _ in range(10):
+            forked.step(random_action(forked))
+
+        replayed = go_engine.GoEngine(board_size=7, superko=True, snapshot_interval=8)
+        states = [np.copy(replayed.current_state)]
+        for action in forked.action_history:
+            replayed.step(action)
+            states.append(np.copy(replayed.current_state))
+        for num_moves in range(len(states)):
+            self.assertTrue((forked.state_at(num_moves) == states[num_moves]).all(), num_moves)
+        for num_moves in [18, 16, 14, 12, 10, 8, 6]:
+            self.assertTrue(forked.regret())
+            self.assertTrue((forked.current_state == states[num_moves]).all(), num_moves)
+        forked.step(random_action(forked))
+
+    def assert_derived_fresh(self, game_state):
+        # Against an engine that never cached anything for the earlier positions
+        replayed = go_engine.GoEngine(board_size=game_state.board_size, superko=True)
+        for action in game_state.action_history:
+            replayed.step(action)
+        for name in ['valid_moves', 'valid_move_idcs', 'advanced_valid_moves', 'advanced_valid_move_idcs']:
+            value = getattr(game_state, name)()
+            self.assertFalse(value.flags.writeable, name)
+            self.assertTrue((value == getattr(replayed, name)()).all(), name)
+        self.assertEqual(game_state.areas(), replayed.areas())
+        self.assertEqual(game_state.winner(), replayed.winner())
+
+    def test_derived_cache_invalidation(self):
+        game_state = go_engine.GoEngine(board_size=5, superko=True)
+        self.assert_derived_fresh(game_state)
+        with self.assertRaises(ValueError):
+            game_state.valid_moves()[0] = False
+        for _ in range(10):
+            game_state.step(random_action(game_state))
+            self.assert_derived_fresh(game_state)
+            game_state.push(random_action(game_state))
+            self.assert_derived_fresh(game_state)
+            game_state.pop()
+            self.assert_derived_fresh(game_state)
+        for _ in range(3):
+            game_state.regret()
+            self.assert_derived_fresh(game_state)
+
+        # The winner, once both players passed
+        game_state.step(None)
+        game_state.push(None)
+        self.assert_derived_fresh(game_state)
+        game_state.pop()
+        self.assert_derived_fresh(game_state)
+        game_state.step(None)
+        self.assertTrue(game_state.game_ended())
+        self.assert_derived_fresh(game_state)
+        game_state.reset()
+        self.assert_derived_fresh(game_state)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import zlib
+
+import numpy as np
+
+import go_engine
+import mcts
+
+
+def fixed_batch_policy_value_fn(board_states, legal_positions):
+    """
+    Stand-in for the network: random priors and value, but a fixed function of each board state
+    """
+    results = []
+    for board_state, positions in zip(board_states, legal_positions):
+        rng = np.random.RandomState(zlib.crc32(np.ascontiguousarray(board_state).tobytes()))
+        priors = rng.dirichlet(np.ones(len(positions)))
+        results.append((zip(positions, priors), rng.uniform(-1, 1)))
+    return results
+
+
+def fixed_policy_value_fn(game_state):
+    return fixed_batch_policy_value_fn(game_state.get_board_state()[np.newaxis], [game_state.valid_move_idcs()])[0]
+
+
+def move_probs(tree, temp):
+    acts, visits = tree.root_visits()
+    return acts, mcts.softmax(1.0 / temp * np.log(np.array(visits) + 1e-10))
+
+
+class TestMCTS(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def setUp(self):
+        np.random.seed(0)
+
+    def test_array_tree_matches_tree(self):
+        for board_size in [5, 9]:
+            game_state = go_engine.GoEngine(board_size=board_size)
+            tree = mcts.MCTS(fixed_policy_value_fn, c_puct=5, n_playout=100)
+            array_tree = mcts.ArrayMCTS(fixed_policy_value_fn, c_puct=5, n_playout=100, capacity=64)
+            # Each move keeps the subtree of the played move in both trees
+            for _ in range(6):
+                for _ in range(100):
+                    tree.playout(game_state)
+                    array_tree.playout(game_state)
+                acts, visits = tree.root_visits()
+                array_acts, array_visits = array_tree.root_visits()
+                self.assertEqual(acts, array_acts)
+                self.assertEqual(list(visits), list(array_visits))
+                for temp in [1e-3, 1.0]:
+                    self.assertTrue(np.allclose(move_probs(tree, temp)[1], move_probs(array_tree, temp)[1]))
+
+                action = acts[int(np.argmax(visits))]
+                game_state.step(action)
+                tree.update_with_move(action)
+                array_tree.update_with_move(action)
+                self.assertGreater(tree.root.n_visits, 0)
+                self.assertEqual(array_tree.N[array_tree.root], tree.root.n_visits)
+
+    def test_batched_search(self):
+        for board_size in [5, 9]:
+            searches = {}
+            for batch_size in [1, 4, 16]:
+                for readonly_views in [False, True]:
+                    game_state = go_engine.GoEngine(board_size=board_size, readonly_views=readonly_views)
+                    np.random.seed(0)
+                    for _ in range(6):
+                        game_state.step(game_state.uniform_random_action())
+                    tree = mcts.ArrayMCTS(fixed_policy_value_fn, c_puct=5, n_playout=400, batch_size=batch_size,
+                                          batch_policy_value_fn=fixed_batch_policy_value_fn)
+                    self.assertTrue(tree.search(game_state))
+                    # Every playout but the first, which expands the root, goes down to a child
+                    acts, visits = tree.root_visits()
+                    self.assertEqual(tree.N[tree.root], 400)
+                    self.assertEqual(np.sum(visits), 399)
+                    searches[batch_size, readonly_views] = acts, visits, move_probs(tree, 1.0)[1]
+
+            acts, visits, probs = searches[1, False]
+            for (batch_size, readonly_views), (batch_acts, batch_visits, batch_probs) in searches.items():
+                # The leaves of a batch are evaluated on their own board states, whatever the views
+                self.assertEqual(batch_acts, searches[batch_size, False][0])
+                self.assertEqual(list(batch_visits), list(searches[batch_size, False][1]))
+                # Virtual loss spreads the paths of a batch, but the search stays close to the sequential one
+                self.assertEqual(batch_acts, acts)
+                self.assertLess(np.abs(batch_probs - probs).sum(), 0.2, (board_size, batch_size))
+
+
+if __name__ == '__main__':
+    unittest.main()
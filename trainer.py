@@ -6,13 +6,14 @@ import numpy as np
 from threading import Thread
 from threading import Lock
 import go_engine
+from GymGo.gym_go import gogame
 
 lock = Lock()
 
 
 class Trainer:
     def __init__(self, epochs=10, learning_rate=1e-3, batch_size=128, temp=1.0, n_playout=100, c_puct=5,
-                 train_model_path='models/my_alpha_go.pdparams'):
+                 train_model_path='models/my_alpha_go.pdparams', adjudicate=False, eval_batch_size=1):
         """
         训练阿尔法狗的训练器
 
@@ -22,6 +23,8 @@ class Trainer:
         :param n_playout: 蒙特卡洛树搜索模拟次数
         :param c_puct: 蒙特卡洛树搜索中计算上置信限的参数
         :param train_model_path: 训练模型的参数路径
+        :param adjudicate: 自对弈时是否在所有位置归属均已确定时提前结束对局，见GoEngine的adjudicate参数
+        :param eval_batch_size: 蒙特卡洛树搜索每轮批量评估的叶结点数，大于1时使用虚拟损失同时选择多条路径
         """
         self.epochs = epochs
         self.learning_rate = learning_rate
@@ -30,11 +33,14 @@ class Trainer:
         self.n_playout = n_playout
         self.c_puct = c_puct
         self.train_model_path = train_model_path
+        self.adjudicate = adjudicate
+        self.eval_batch_size = eval_batch_size
         self.train_step = 0
         self.model_update_step = 0
 
         # 创建阿尔法狗
-        self.player = AlphaGoPlayer(train_model_path, c_puct, n_playout, is_selfplay=True)
+        self.player = AlphaGoPlayer(train_model_path, c_puct, n_playout, is_selfplay=True,
+                                    eval_batch_size=eval_batch_size)
 
         # 创建训练优化器
         self.optimizer = paddle.optimizer.Momentum(learning_rate=learning_rate,
@@ -80,6 +86,7 @@ class Trainer:
     def self_play_one_game(self, game):
         """自对弈依据游戏，并获取对弈数据"""
         states, mcts_probs, current_players = [], [], []
+        game.train_game_state.adjudicate = self.adjudicate
 
         while True:
             if game.surface_state == 'play':
@@ -117,21 +124,12 @@ class Trainer:
 
     @staticmethod
     def get_equi_data(play_data):
-        """通过旋转和翻转来扩增数据"""
-        extend_data = []
-        for state, mcts_porb, winner in play_data:
-            board_size = state.shape[-1]
-            for i in [1, 2, 3, 4]:
-                # 逆时针旋转
-                equi_state = np.array([np.rot90(s, i) for s in state])
-                pass_move_prob = mcts_porb[-1]
-                equi_mcts_prob = np.rot90(np.flipud(mcts_porb[:-1].reshape(board_size, board_size)), i)
-                extend_data.append((equi_state, np.append(np.flipud(equi_mcts_prob).flatten(), pass_move_prob), winner))
-                # 翻转
-                equi_state = np.array([np.fliplr(s) for s in equi_state])
-                equi_mcts_prob = np.fliplr(equi_mcts_prob)
-                extend_data.append((equi_state, np.append(np.flipud(equi_mcts_prob).flatten(), pass_move_prob), winner))
-        return extend_data
+        """通过旋转和翻转来扩增数据，用预先计算的对称索引表一次性得到全部8种等价表示"""
+        states, mcts_probs, winners = zip(*play_data)
+        states = gogame.batch_symmetries(np.array(states))
+        mcts_probs = gogame.batch_policy_symmetries(np.array(mcts_probs))
+        return list(zip(states.reshape(-1, *states.shape[2:]), mcts_probs.reshape(-1, mcts_probs.shape[-1]),
+                        np.repeat(winners, 8)))
 
     def update_network(self, game, play_datas):
         """更新网络参数"""